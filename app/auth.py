@@ -1,25 +1,95 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from functools import lru_cache
+from typing import Annotated, NamedTuple
 
 import jwt
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
-from app.models import TokenData, User, UserInDB, fake_users_db
+from app import metrics
+from app.models import TokenData, User, UserInDB, fake_api_keys_db, fake_users_db
+import asyncio
 import bcrypt
+import hashlib
 import os
+import secrets
+import time
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+
+class JWTSettings(NamedTuple):
+    secret_key: str
+    algorithm: str
+
+
+@lru_cache
+def get_settings() -> JWTSettings:
+    """Read the token signing settings once; call cache_clear() to reload."""
+    return JWTSettings(os.getenv("SECRET_KEY"), os.getenv("ALGORITHM"))
+
+
+class TokenCache:
+    """Bounded LRU map of verified token digests to their resolved user.
+
+    Entries expire at the token's ``exp`` claim. Only a SHA-256 digest of
+    each token is kept as the key.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[User, float]] = OrderedDict()
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> User | None:
+        digest = self._digest(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
+        return user
+
+    def put(self, token: str, user: User, expires_at: float):
+        self._entries[self._digest(token)] = (user, expires_at)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, username: str):
+        """Forget every token of a user, e.g. after disabling the account."""
+        for digest in [
+            digest
+            for digest, (user, _) in self._entries.items()
+            if user.username == username
+        ]:
+            del self._entries[digest]
+
+    def clear(self):
+        self._entries.clear()
+
+
+token_cache = TokenCache(int(os.getenv("TOKEN_CACHE_SIZE", "1024")))
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
-    )
+    with metrics.BCRYPT_SECONDS.time():
+        return bcrypt.checkpw(
+            plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+        )
 
 
 def get_password_hash(password):
@@ -41,6 +111,65 @@ def authenticate_user(fake_db, username: str, password: str):
     return user
 
 
+class PasswordVerifier:
+    """Run bcrypt checks on a small thread pool with admission control.
+
+    bcrypt releases the GIL, so checks on ``workers`` threads do not block
+    the event loop. At most ``max_pending`` checks may be running or queued;
+    beyond that ``verify`` fails fast with 503 instead of queueing, so a
+    login burst cannot build an unbounded backlog. The pool is started on
+    the first check and stopped by ``shutdown`` when the app exits.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 8):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts in progress, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="bcrypt"
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, verify_password, plain_password, hashed_password
+            )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_verifier = PasswordVerifier(
+    workers=int(os.getenv("LOGIN_WORKERS", "2")),
+    max_pending=int(os.getenv("LOGIN_MAX_PENDING", "8")),
+)
+
+
+async def authenticate_user_async(fake_db, username: str, password: str):
+    """Same as authenticate_user, with bcrypt off the event loop."""
+    user = get_user(fake_db, username)
+    if not user:
+        return False
+    if not await password_verifier.verify(password, user.hashed_password):
+        return False
+    return user
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -48,23 +177,26 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    settings = get_settings()
     encoded_jwt = jwt.encode(
-        to_encode, os.getenv("SECRET_KEY"), algorithm=os.getenv("ALGORITHM")
+        to_encode, settings.secret_key, algorithm=settings.algorithm
     )
     return encoded_jwt
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        # breakpoint()
-        payload = jwt.decode(
-            token, os.getenv("SECRET_KEY"), algorithms=os.getenv("ALGORITHM")
-        )
+        settings = get_settings()
+        payload = jwt.decode(token, settings.secret_key, algorithms=settings.algorithm)
         username = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -74,6 +206,8 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     user = get_user(fake_users_db, username=token_data.username)
     if user is None:
         raise credentials_exception
+    if "exp" in payload:
+        token_cache.put(token, user, payload["exp"])
     return user
 
 
@@ -83,3 +217,50 @@ async def get_current_active_user(
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+def hash_api_key(api_key: str) -> str:
+    """API keys are random 256-bit tokens, so a plain SHA-256 is enough."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def generate_api_key() -> tuple[str, str]:
+    """Return a new API key and the digest to store in API_KEYS."""
+    api_key = secrets.token_urlsafe(32)
+    return api_key, hash_api_key(api_key)
+
+
+def get_api_key_user(db, api_key: str):
+    entry = db.get(hash_api_key(api_key))
+    if entry is None:
+        return None
+    return get_user(fake_users_db, entry["username"])
+
+
+async def get_current_client(
+    token: Annotated[str | None, Depends(optional_oauth2_scheme)],
+    api_key: Annotated[str | None, Depends(api_key_header)],
+):
+    """Resolve the caller from an X-API-Key header or a bearer token."""
+    if api_key:
+        user = get_api_key_user(fake_api_keys_db, api_key)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid API key",
+                headers={"WWW-Authenticate": "ApiKey"},
+            )
+        return user
+    if token:
+        return await get_current_user(token)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def get_current_active_client(
+    current_user: Annotated[User, Depends(get_current_client)],
+):
+    return await get_current_active_user(current_user)
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+from app.csv_store import store
+from app.models import PUBLIC_DATASETS
+
+CSV_COLUMNS = {
+    "general": ["dataset", "category", "year", "item", "sub_item", "quantity"],
+    "trade": ["dataset", "category", "year", "country", "quantity", "amount"],
+}
+
+
+def iter_years(dataset: str, start_year: int, end_year: int):
+    """Yield (category, year, rows) for every file of a dataset, a year at a time."""
+    for category, matrix in store.matrices(dataset):
+        for year, rows in matrix.iter_years(start_year, end_year):
+            yield category, year, rows
+
+
+def iter_ndjson(dataset: str, start_year: int, end_year: int):
+    """Yield NDJSON chunks, one per category and year, under the public name."""
+    name = PUBLIC_DATASETS[dataset]
+    for category, year, rows in iter_years(dataset, start_year, end_year):
+        yield "".join(
+            json.dumps(
+                {"dataset": name, "category": category, **row},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+def iter_csv(dataset: str, start_year: int, end_year: int):
+    """Yield CSV chunks, one per category and year, after a header line.
+
+    Sub-items are flattened into their own lines, with the parent in
+    ``item`` and their name in ``sub_item``. Lines carry the public name of
+    the dataset.
+    """
+    name = PUBLIC_DATASETS[dataset]
+    matrices = store.matrices(dataset)
+    kind = matrices[0][1].kind if matrices else "general"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS[kind])
+
+    for category, year, rows in iter_years(dataset, start_year, end_year):
+        for row in rows:
+            if kind == "trade":
+                writer.writerow(
+                    [
+                        name,
+                        category,
+                        year,
+                        row["country"],
+                        row["quantity"],
+                        row["amount"],
+                    ]
+                )
+                continue
+            writer.writerow([name, category, year, row["item"], "", row["quantity"]])
+            for sub_item in row["sub_items"]:
+                writer.writerow(
+                    [
+                        name,
+                        category,
+                        year,
+                        row["item"],
+                        sub_item["name"],
+                        sub_item["quantity"],
+                    ]
+                )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+# Per-dataset (open year, closed year) TTLs in seconds. Closed years are
+# historical figures that vitibrasil no longer revises.
+DEFAULT_OPEN_TTL = float(os.getenv("CACHE_TTL_OPEN", "600"))
+DEFAULT_CLOSED_TTL = float(os.getenv("CACHE_TTL_CLOSED", "86400"))
+DATASET_TTLS = {
+    "producao": (DEFAULT_OPEN_TTL, DEFAULT_CLOSED_TTL),
+    "comercializacao": (DEFAULT_OPEN_TTL, DEFAULT_CLOSED_TTL),
+    "processamento": (DEFAULT_OPEN_TTL, DEFAULT_CLOSED_TTL),
+    "importacao": (DEFAULT_OPEN_TTL, DEFAULT_CLOSED_TTL),
+    "exportacao": (DEFAULT_OPEN_TTL, DEFAULT_CLOSED_TTL),
+}
+
+# Set while a request is answered with fallback data, such as the CSV
+# store standing in for an unreachable upstream or an empty table, so the
+# response is not kept in the body cache or marked public.
+degraded: ContextVar[bool] = ContextVar("degraded", default=False)
+
+
+def is_closed_year(year: int) -> bool:
+    """Return True for years old enough that upstream no longer revises them."""
+    open_years = int(os.getenv("CACHE_OPEN_YEARS", "2"))
+    return year <= date.today().year - open_years
+
+
+def ttl_for(dataset: str, year: int) -> float:
+    """Return how long a parsed table stays fresh for a dataset and year."""
+    open_ttl, closed_ttl = DATASET_TTLS.get(
+        dataset, (DEFAULT_OPEN_TTL, DEFAULT_CLOSED_TTL)
+    )
+    return closed_ttl if is_closed_year(year) else open_ttl
+
+
+@dataclass(eq=False)
+class CacheEntry:
+    value: Any
+    fresh_until: float
+    stale_until: float
+
+
+class ResultCache:
+    """LRU cache of parsed tables with per-entry TTL and stale-while-revalidate.
+
+    Fresh entries are returned directly. Entries past their TTL but still
+    inside the stale window are returned at once while a single background
+    task reloads them. Loaders returning None are treated as failures and
+    never stored.
+    """
+
+    def __init__(self, max_entries: int = 2048, stale_ttl: float = 86400):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def get(self, key: Hashable, now: float | None = None) -> CacheEntry | None:
+        """Return the entry for key if it is still servable, else None."""
+        now = time.monotonic() if now is None else now
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now >= entry.stale_until:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def peek(self, key: Hashable) -> CacheEntry | None:
+        """Return the entry for key without expiring it or marking it used."""
+        return self._entries.get(key)
+
+    def set(self, key: Hashable, value: Any, ttl: float, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        self._entries[key] = CacheEntry(
+            value=value, fresh_until=now + ttl, stale_until=now + ttl + self.stale_ttl
+        )
+        self._entries.move_to_end(key)
+        self.version += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable | None = None):
+        """Drop one key, or every entry when key is None."""
+        self.version += 1
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float
+    ):
+        """Return the cached value for key, loading it on a miss.
+
+        Returns None when the key is not cached and the loader fails.
+        """
+        now = time.monotonic()
+        entry = self.get(key, now)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._schedule_refresh(key, loader, ttl)
+            return entry.value
+
+        self.misses += 1
+        value = await loader()
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+    async def refresh(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float
+    ):
+        """Reload key now, keeping the previous value if the loader fails."""
+        try:
+            value = await loader()
+        except Exception:
+            logger.exception("Background refresh failed for %s", key)
+            return None
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+    def _schedule_refresh(self, key, loader, ttl):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self.refresh(key, loader, ttl))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    def items(self) -> list[tuple[Hashable, CacheEntry]]:
+        """Return a snapshot of every (key, entry), least recently used first."""
+        return list(self._entries.items())
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshing": len(self._refreshing),
+        }
+
+
+result_cache = ResultCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "2048")),
+    stale_ttl=float(os.getenv("CACHE_STALE_TTL", "86400")),
+)
@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+@dataclass
+class RowChange:
+    name: str
+    change: str
+    row: dict | None
+    previous: dict | None
+
+
+def row_name(row: dict) -> str:
+    return row["country"] if "country" in row else row["item"]
+
+
+def keyed(rows) -> dict[tuple[str, int], dict]:
+    """Key rows by name, numbering repeats of a name in order of appearance."""
+    seen: dict[str, int] = {}
+    result = {}
+    for row in rows:
+        name = row_name(row)
+        seen[name] = seen.get(name, -1) + 1
+        result[(name, seen[name])] = row
+    return result
+
+
+def diff_rows(previous, current) -> list[RowChange]:
+    """Return the rows added, removed or changed between two versions of a table.
+
+    Rows are matched by item or country name. A general row whose
+    sub-items changed is reported as changed, with all of its sub-items.
+    """
+    before, after = keyed(previous), keyed(current)
+    changes = []
+    for key, row in after.items():
+        old = before.get(key)
+        if old is None:
+            changes.append(RowChange(key[0], ADDED, row, None))
+        elif old != row:
+            changes.append(RowChange(key[0], CHANGED, row, old))
+    for key, old in before.items():
+        if key not in after:
+            changes.append(RowChange(key[0], REMOVED, None, old))
+    return changes
+
+
+def replaces_table(changes: list[RowChange], previous) -> bool:
+    """Return True if changes remove every row of a non-empty previous table."""
+    removed = sum(change.change == REMOVED for change in changes)
+    return bool(previous) and removed == len(previous)
@@ -0,0 +1,191 @@
+import logging
+import os
+import time
+
+from app.matrix import SeriesMatrix
+from app.parser_csv import general_csv_years, import_export_csv_years
+from app.stats import SeriesStats
+from app.table import Table, kind_for
+
+logger = logging.getLogger(__name__)
+
+CSV_SOURCES = {
+    "processamento": {
+        "viniferas": {
+            "file": "processamento-viniferas.csv",
+            "key": "cultivar",
+            "delimiter": ";",
+        },
+        "americanas-e-hibridas": {
+            "file": "processamento-americanas-e-hibridas.csv",
+            "key": "cultivar",
+            "delimiter": "\t",
+        },
+        "uva-de-mesa": {
+            "file": "processamento-uva-de-mesa.csv",
+            "key": "cultivar",
+            "delimiter": "\t",
+        },
+        "sem-classificacao": {
+            "file": "processamento-sem-classificacao.csv",
+            "key": "cultivar",
+            "delimiter": "\t",
+        },
+    },
+    "importacao": {
+        "vinhos-de-mesa": {"file": "importacao-vinhos-de-mesa.csv", "delimiter": "\t"},
+        "espumantes": {"file": "importacao-espumantes.csv", "delimiter": "\t"},
+        "uvas-frescas": {"file": "importacao-uvas-frescas.csv", "delimiter": "\t"},
+        "uvas-passas": {"file": "importacao-uvas-passas.csv", "delimiter": "\t"},
+        "suco-de-uva": {"file": "importacao-suco-de-uva.csv", "delimiter": ";"},
+    },
+    "exportacao": {
+        "vinhos-de-mesa": {"file": "exportacao-vinhos-de-mesa.csv", "delimiter": "\t"},
+        "espumantes": {"file": "exportacao-espumantes.csv", "delimiter": "\t"},
+        "uvas-frescas": {"file": "exportacao-uvas-frescas.csv", "delimiter": "\t"},
+        "suco-de-uva": {"file": "exportacao-suco-uva.csv", "delimiter": "\t"},
+    },
+    "producao": {"file": "producao.csv", "key": "produto", "delimiter": ";"},
+    "comercializacao": {
+        "file": "comercializacao.csv",
+        "key": "Produto",
+        "delimiter": ";",
+    },
+}
+
+
+def iter_sources():
+    """Yield (dataset, category, source) for every CSV, category None if flat."""
+    for dataset, spec in CSV_SOURCES.items():
+        if "file" in spec:
+            yield dataset, None, spec
+        else:
+            for category, source in spec.items():
+                yield dataset, category, source
+
+
+class CsvStore:
+    """In-memory index of the files/*.csv fallback datasets.
+
+    Every file is parsed once into a ``SeriesMatrix`` for multi-year
+    queries, the ``SeriesStats`` aggregates of that matrix and a
+    ``(dataset, category, year) -> Table`` index over the matrix columns, so
+    a lookup is a dict hit. Files are re-parsed when their mtime changes,
+    checked at most once every ``reload_interval`` seconds.
+    """
+
+    def __init__(self, files_dir: str, reload_interval: float = 2.0):
+        self.files_dir = files_dir
+        self.reload_interval = reload_interval
+        self._index: dict[tuple, Table] = {}
+        self._matrices: dict[tuple, SeriesMatrix] = {}
+        self._stats: dict[tuple, SeriesStats] = {}
+        self._mtimes: dict[tuple, int] = {}
+        self._checked_at = 0.0
+        self.generation = 0
+
+    def path(self, source: dict) -> str:
+        return os.path.join(self.files_dir, source["file"])
+
+    def load_all(self):
+        try:
+            for dataset, category, source in iter_sources():
+                self._load(dataset, category, source)
+        finally:
+            self._checked_at = time.monotonic()
+
+    def _load(self, dataset: str, category: str | None, source: dict):
+        """Parse one file, keeping the data loaded before if it fails.
+
+        A file that fails to parse is not retried until its mtime changes.
+        """
+        path = self.path(source)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError as e:
+            logger.error("Failed to load %s: %s", path, e)
+            return
+        try:
+            if "key" in source:
+                years = general_csv_years(path, source["key"], source["delimiter"])
+                matrix = SeriesMatrix.from_general_years(years)
+            else:
+                years = import_export_csv_years(path, source["delimiter"])
+                matrix = SeriesMatrix.from_trade_years(years)
+            stats = SeriesStats.from_matrix(matrix)
+        except Exception:
+            logger.exception("Failed to load %s", path)
+            self._mtimes[(dataset, category)] = mtime
+            return
+
+        for key in [key for key in self._index if key[:2] == (dataset, category)]:
+            del self._index[key]
+        for column, year in enumerate(matrix.years.tolist()):
+            self._index[(dataset, category, year)] = matrix.table(column)
+        self._matrices[(dataset, category)] = matrix
+        self._stats[(dataset, category)] = stats
+        self._mtimes[(dataset, category)] = mtime
+        self.generation += 1
+
+    def reload_changed(self):
+        """Re-parse every file whose mtime differs from the loaded one."""
+        try:
+            for dataset, category, source in iter_sources():
+                try:
+                    mtime = os.stat(self.path(source)).st_mtime_ns
+                except OSError:
+                    continue
+                if self._mtimes.get((dataset, category)) != mtime:
+                    logger.info("Reloading %s", source["file"])
+                    self._load(dataset, category, source)
+        finally:
+            self._checked_at = time.monotonic()
+
+    def _check_reload(self):
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload_changed()
+
+    def version(self) -> int:
+        """Return a number that changes whenever a file is reloaded."""
+        self._check_reload()
+        return self.generation
+
+    def lookup(self, dataset: str, year: int, category: str | None = None) -> Table:
+        """Return the CSV table for a dataset, category and year."""
+        self._check_reload()
+        table = self._index.get((dataset, category, year))
+        return (
+            table if table is not None else Table.from_rows([], year, kind_for(dataset))
+        )
+
+    def matrix(self, dataset: str, category: str | None = None) -> SeriesMatrix | None:
+        self._check_reload()
+        return self._matrices.get((dataset, category))
+
+    def stats(self, dataset: str, category: str | None = None) -> SeriesStats | None:
+        self._check_reload()
+        return self._stats.get((dataset, category))
+
+    def matrices(self, dataset: str):
+        """Return (category, matrix) for every loaded file of a dataset."""
+        self._check_reload()
+        return [
+            (category, self._matrices[(name, category)])
+            for name, category, _ in iter_sources()
+            if name == dataset and (name, category) in self._matrices
+        ]
+
+    def series(
+        self, dataset: str, start_year: int, end_year: int, category: str | None = None
+    ) -> list:
+        """Return the CSV rows for every year from start_year to end_year."""
+        matrix = self.matrix(dataset, category)
+        if matrix is None:
+            return []
+        return matrix.rows(start_year, end_year)
+
+
+store = CsvStore(
+    files_dir=os.getenv("FILES_DIR", f"{os.getcwd()}/files"),
+    reload_interval=float(os.getenv("CSV_RELOAD_INTERVAL", "2")),
+)
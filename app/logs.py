@@ -0,0 +1,194 @@
+import atexit
+import logging
+import os
+import queue
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+import structlog
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Per-module levels, e.g. LOG_LEVELS="app.scraping=DEBUG,uvicorn.access=WARNING".
+LOG_LEVELS = os.getenv("LOG_LEVELS", "uvicorn.access=WARNING,httpx=WARNING")
+# Keep a share of the records below WARNING of busy loggers, e.g.
+# LOG_SAMPLING="app.scraping=0.1,app.parser_csv=0.01".
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "kv")
+
+request_stats: ContextVar[dict | None] = ContextVar("request_stats", default=None)
+access_logger = structlog.get_logger("app.access")
+
+_listener: QueueListener | None = None
+
+
+def parse_settings(value: str) -> dict[str, str]:
+    """Parse "name=value,name=value" into a dict."""
+    settings = {}
+    for entry in value.split(","):
+        name, _, setting = entry.strip().partition("=")
+        if name and setting:
+            settings[name.strip()] = setting.strip()
+    return settings
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every 1/rate records below WARNING from the configured loggers.
+
+    Records are counted per logger and message template, so a rare message
+    is not crowded out by a frequent one from the same module.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._counts: dict[tuple, int] = {}
+
+    def rate(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        key = (record.name, record.msg if isinstance(record.msg, str) else None)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % round(1 / rate) == 0
+
+
+class LocalQueueHandler(QueueHandler):
+    """QueueHandler for a queue read in the same process.
+
+    The stock handler formats each record before queueing it so it can be
+    pickled; here the record is queued as is and all formatting happens on
+    the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def renderer():
+    if LOG_FORMAT == "json":
+        return structlog.processors.JSONRenderer()
+    return structlog.processors.KeyValueRenderer(
+        key_order=["timestamp", "level", "logger", "event"], drop_missing=True
+    )
+
+
+def setup() -> QueueListener:
+    """Route every log record through a queue to a stream handler thread.
+
+    Records from stdlib loggers and from structlog are rendered the same
+    way, as key=value pairs or as JSON with LOG_FORMAT=json. Safe to call
+    more than once; later calls return the running listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    shared = [
+        structlog.stdlib.add_logger_name,
+        structlog.stdlib.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso"),
+    ]
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            *shared,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(
+        structlog.stdlib.ProcessorFormatter(
+            foreign_pre_chain=[
+                *shared,
+                structlog.stdlib.ExtraAdder(),
+            ],
+            processors=[
+                structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                structlog.processors.format_exc_info,
+                renderer(),
+            ],
+        )
+    )
+
+    records = queue.SimpleQueue()
+    handler = LocalQueueHandler(records)
+    rates = {name: float(rate) for name, rate in parse_settings(LOG_SAMPLING).items()}
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in parse_settings(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def record_upstream(seconds: float):
+    """Add one upstream fetch to the summary of the current request."""
+    stats = request_stats.get()
+    if stats is not None:
+        stats["upstream_calls"] += 1
+        stats["upstream_ms"] += seconds * 1000
+
+
+class RequestLogMiddleware:
+    """ASGI middleware logging one summary line per request.
+
+    The line carries the method, path, status, total time and the number
+    and total time of upstream fetches made while serving the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"upstream_calls": 0, "upstream_ms": 0.0}
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_stats.reset(token)
+            access_logger.info(
+                "request",
+                method=scope["method"],
+                path=scope["path"],
+                status=status_code,
+                duration_ms=round((time.perf_counter() - start) * 1000, 2),
+                upstream_calls=stats["upstream_calls"],
+                upstream_ms=round(stats["upstream_ms"], 2),
+            )
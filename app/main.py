@@ -1,11 +1,57 @@
-from fastapi import FastAPI
-from app import routers
-import logging
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI()
+from fastapi import FastAPI  # noqa: E402
+from fastapi.middleware.gzip import GZipMiddleware  # noqa: E402
+from app import (  # noqa: E402
+    auth,
+    logs,
+    metrics,
+    profiling,
+    responses,
+    routers,
+    scraping,
+    services,
+    warmer,
+)
+from app.csv_store import store  # noqa: E402
+
+logs.setup()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    store.load_all()
+    services.load_snapshots()
+    await scraping.start_client()
+    tasks = []
+
+    def start_warmer():
+        if warmer.enabled():
+            tasks.append(asyncio.create_task(warmer.warmer.run()))
+
+    # With a shared cache only the writer crawls, including a worker that
+    # takes over after the writer exits; the other workers read.
+    if services.shared_cache:
+        services.shared_cache.reload()
+        tasks.append(asyncio.create_task(services.share_cache(start_warmer)))
+    else:
+        start_warmer()
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await scraping.close_client()
+    auth.password_verifier.shutdown()
+    if services.snapshots:
+        services.snapshots.close()
+    if services.shared_cache:
+        services.shared_cache.close()
 
 
 description = """
@@ -16,11 +62,15 @@ app = FastAPI(
     version="0.1.0",
     description=description,
     openapi_url="/api/v1/openapi.json",
+    lifespan=lifespan,
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=responses.COMPRESSION_MIN_SIZE)
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(logs.RequestLogMiddleware)
+
 app.include_router(routers.auth_router)
 app.include_router(routers.api_router)
-
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s %(levelname)-5.5s [%(name)s] %(message)s"
-)
+app.include_router(routers.health_router)
+app.include_router(routers.debug_router)
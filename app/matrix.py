@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+
+from app.table import Table, intern_names
+
+
+@dataclass
+class SeriesMatrix:
+    """Items x years matrix of one CSV dataset.
+
+    ``names`` holds one entry per matrix row. For general datasets
+    ``parents`` is -1 for top-level items and the row index of the parent
+    item for sub-items; trade (import/export) datasets have no sub-items.
+    ``values`` maps each metric to an int64 array of shape (rows, years).
+    Names are interned, and the ``Table`` of each year shares them.
+    """
+
+    kind: str
+    years: np.ndarray
+    names: list[str]
+    parents: np.ndarray
+    values: dict[str, np.ndarray]
+
+    @classmethod
+    def from_general_years(cls, years_rows: dict[int, list]):
+        years = sorted(years_rows)
+        names, parents = [], []
+        for item in years_rows[years[0]] if years else []:
+            parent = len(names)
+            names.append(item["item"])
+            parents.append(-1)
+            for sub_item in item["sub_items"]:
+                names.append(sub_item["name"])
+                parents.append(parent)
+
+        quantity = np.zeros((len(names), len(years)), dtype=np.int64)
+        for column, year in enumerate(years):
+            row = 0
+            for item in years_rows[year]:
+                quantity[row, column] = item["quantity"]
+                row += 1
+                for sub_item in item["sub_items"]:
+                    quantity[row, column] = sub_item["quantity"]
+                    row += 1
+        return cls(
+            kind="general",
+            years=np.array(years, dtype=np.int64),
+            names=intern_names(names),
+            parents=np.array(parents, dtype=np.int64),
+            values={"quantity": quantity},
+        )
+
+    @classmethod
+    def from_trade_years(cls, years_rows: dict[int, list]):
+        years = sorted(years_rows)
+        names = [row["country"] for row in years_rows[years[0]]] if years else []
+        quantity = np.zeros((len(names), len(years)), dtype=np.int64)
+        amount = np.zeros((len(names), len(years)), dtype=np.int64)
+        for column, year in enumerate(years):
+            quantity[:, column] = [row["quantity"] for row in years_rows[year]]
+            amount[:, column] = [row["amount"] for row in years_rows[year]]
+        return cls(
+            kind="trade",
+            years=np.array(years, dtype=np.int64),
+            names=intern_names(names),
+            parents=np.full(len(names), -1, dtype=np.int64),
+            values={"quantity": quantity, "amount": amount},
+        )
+
+    def columns(self, start_year: int, end_year: int) -> slice:
+        """Return the column slice covering start_year..end_year inclusive."""
+        lo = int(np.searchsorted(self.years, start_year, side="left"))
+        hi = int(np.searchsorted(self.years, end_year, side="right"))
+        return slice(lo, hi)
+
+    @cached_property
+    def _layout(self):
+        """Return the general rows split into items and sub-item offsets."""
+        top = np.flatnonzero(self.parents == -1)
+        sub = np.flatnonzero(self.parents != -1)
+        quantity = self.values["quantity"]
+        return (
+            [self.names[row] for row in top.tolist()],
+            quantity[top],
+            np.append(np.searchsorted(sub, top), len(sub)),
+            [self.names[row] for row in sub.tolist()],
+            quantity[sub],
+        )
+
+    def table(self, column: int) -> Table:
+        """Return one year of the matrix as a ``Table`` sharing its arrays."""
+        year = int(self.years[column])
+        if self.kind == "trade":
+            return Table(
+                kind="trade",
+                year=year,
+                names=self.names,
+                quantity=self.values["quantity"][:, column],
+                amount=self.values["amount"][:, column],
+            )
+        names, quantity, offsets, sub_names, sub_quantity = self._layout
+        return Table(
+            kind="general",
+            year=year,
+            names=names,
+            quantity=quantity[:, column],
+            sub_offsets=offsets,
+            sub_names=sub_names,
+            sub_quantity=sub_quantity[:, column],
+        )
+
+    def iter_years(self, start_year: int, end_year: int):
+        """Yield (year, rows) for every year in the range, one year at a time."""
+        columns = self.columns(start_year, end_year)
+        for column in range(len(self.years))[columns]:
+            table = self.table(column)
+            yield table.year, table.to_rows()
+
+    def rows(self, start_year: int, end_year: int) -> list:
+        """Return the response rows for every year in the range, year by year."""
+        return [
+            row for _, rows in self.iter_years(start_year, end_year) for row in rows
+        ]
@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+import os
+from typing import Annotated, Literal, Union
+
+from pydantic import BaseModel, Field
 
 fake_users_db = {
     "user1": {
@@ -9,6 +12,63 @@ fake_users_db = {
 }
 
 
+# API keys are stored as SHA-256 hex digests, configured as
+# API_KEYS="username:digest,username:digest" and read once at import. A key
+# is revoked by removing its digest from API_KEYS and restarting every worker.
+fake_api_keys_db = {
+    key_hash: {"username": username}
+    for username, _, key_hash in (
+        entry.strip().partition(":")
+        for entry in os.getenv("API_KEYS", "").split(",")
+        if entry.strip()
+    )
+}
+
+FIRST_YEAR = 1970
+LAST_YEAR = 2023
+LAST_TRADE_YEAR = 2024
+
+ProcessingCategory = Literal[
+    "viniferas", "americanas-e-hibridas", "uva-de-mesa", "sem-classificacao"
+]
+ImportCategory = Literal[
+    "vinhos-de-mesa", "espumantes", "uvas-frescas", "uvas-passas", "suco-de-uva"
+]
+ExportCategory = Literal["vinhos-de-mesa", "espumantes", "uvas-frescas", "suco-de-uva"]
+DatasetName = Literal[
+    "production", "commercialization", "processing", "import", "export"
+]
+TradeSort = Literal["country", "-country", "quantity", "-quantity", "amount", "-amount"]
+StatsOperation = Literal["top", "sum", "growth", "share"]
+StatsMetric = Literal["quantity", "amount"]
+
+
+class TradeQuery(BaseModel):
+    """Filters, order, page and projection of an import/export listing."""
+
+    countries: list[str] = []
+    min_quantity: int | None = None
+    sort: TradeSort | None = None
+    fields: list[str] = []
+    limit: int | None = None
+    cursor: str | None = None
+
+    def is_empty(self) -> bool:
+        return self == TradeQuery()
+
+
+# Public dataset names mapped to the internal dataset and its last year.
+DATASETS = {
+    "production": ("producao", LAST_YEAR),
+    "commercialization": ("comercializacao", LAST_YEAR),
+    "processing": ("processamento", LAST_YEAR),
+    "import": ("importacao", LAST_TRADE_YEAR),
+    "export": ("exportacao", LAST_TRADE_YEAR),
+}
+# Internal dataset names mapped back to their public name.
+PUBLIC_DATASETS = {internal: name for name, (internal, _) in DATASETS.items()}
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -25,3 +85,43 @@ class User(BaseModel):
 
 class UserInDB(User):
     hashed_password: str
+
+
+class ProductionSpec(BaseModel):
+    dataset: Literal["production"]
+    year: int = Field(LAST_YEAR, ge=FIRST_YEAR, le=LAST_YEAR)
+
+
+class CommercializationSpec(BaseModel):
+    dataset: Literal["commercialization"]
+    year: int = Field(LAST_YEAR, ge=FIRST_YEAR, le=LAST_YEAR)
+
+
+class ProcessingSpec(BaseModel):
+    dataset: Literal["processing"]
+    category: ProcessingCategory
+    year: int = Field(LAST_YEAR, ge=FIRST_YEAR, le=LAST_YEAR)
+
+
+class ImportSpec(BaseModel):
+    dataset: Literal["import"]
+    category: ImportCategory
+    year: int = Field(LAST_TRADE_YEAR, ge=FIRST_YEAR, le=LAST_TRADE_YEAR)
+
+
+class ExportSpec(BaseModel):
+    dataset: Literal["export"]
+    category: ExportCategory
+    year: int = Field(LAST_TRADE_YEAR, ge=FIRST_YEAR, le=LAST_TRADE_YEAR)
+
+
+BatchSpec = Annotated[
+    Union[
+        ProductionSpec, CommercializationSpec, ProcessingSpec, ImportSpec, ExportSpec
+    ],
+    Field(discriminator="dataset"),
+]
+
+
+class BatchRequest(BaseModel):
+    items: list[dict] = Field(min_length=1, max_length=50)
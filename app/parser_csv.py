@@ -4,6 +4,8 @@ import logging
 from decimal import InvalidOperation
 from typing import Optional
 
+from app import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,11 +23,12 @@ def read_csv_file(path: str, delimiter: str = ";"):
         return list(csv.DictReader(file, delimiter=delimiter))
 
 
+@metrics.timed(metrics.PARSE_SECONDS, "general_csv")
 def general_csv(
     path: str, year: int = 2023, key: Optional[str] = None, delimiter: str = ";"
 ):
     """Parse structured CSV with main items and sub-items."""
-    logger.info("Request csv")
+    logger.debug("Request csv")
 
     reader = read_csv_file(path, delimiter)
     results = []
@@ -50,9 +53,10 @@ def general_csv(
     return results
 
 
+@metrics.timed(metrics.PARSE_SECONDS, "import_export_csv")
 def import_export_csv(path: str, year: int = 2023, delimiter: str = ";"):
     """Parse import/export data CSV with duplicate headers."""
-    logger.info("Request csv")
+    logger.debug("Request csv")
 
     file = open(path, "r")
     reader = csv.reader(file, delimiter=delimiter)
@@ -82,3 +86,77 @@ def import_export_csv(path: str, year: int = 2023, delimiter: str = ";"):
         results.append(item)
 
     return results
+
+
+@metrics.timed(metrics.PARSE_SECONDS, "general_csv_years")
+def general_csv_years(path: str, key: str, delimiter: str = ";"):
+    """Parse every year column of a structured CSV in a single pass.
+
+    Returns a dict mapping each year to the rows ``general_csv`` would
+    return for it. Lines with missing columns are skipped.
+    """
+    logger.debug("Load csv %s", path)
+
+    with open(path, "r", encoding="utf-8") as file:
+        reader = csv.DictReader(file, delimiter=delimiter)
+        years = [int(name) for name in reader.fieldnames if name.isdigit()]
+        results = {year: [] for year in years}
+
+        for row in reader:
+            if None in row.values():
+                # Short line: some columns are missing.
+                continue
+            control = row["control"]
+            name = row[key].strip()
+            if control.isupper() or control == "":
+                for year in years:
+                    results[year].append(
+                        {
+                            "item": name,
+                            "quantity": parse_str_to_number(row[f"{year}"]),
+                            "year": year,
+                            "sub_items": [],
+                        }
+                    )
+            elif "_" in control and results[years[0]]:
+                for year in years:
+                    results[year][-1]["sub_items"].append(
+                        {"name": name, "quantity": parse_str_to_number(row[f"{year}"])}
+                    )
+    return results
+
+
+@metrics.timed(metrics.PARSE_SECONDS, "import_export_csv_years")
+def import_export_csv_years(path: str, delimiter: str = ";"):
+    """Parse every year of an import/export CSV in a single pass.
+
+    Each year appears twice in the header: quantity first, then amount.
+    Returns a dict mapping each year to the rows ``import_export_csv``
+    would return for it. Blank lines and lines with missing columns are
+    skipped.
+    """
+    logger.debug("Load csv %s", path)
+
+    with open(path, "r", encoding="utf-8") as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        headers = next(reader)
+        country_index = headers.index("País")
+        columns = defaultdict(list)
+        for index, header in enumerate(headers):
+            if header.isdigit():
+                columns[int(header)].append(index)
+
+        results = {year: [] for year in columns}
+        for row in reader:
+            if len(row) < len(headers):
+                continue
+            for year, (quantity_index, amount_index) in columns.items():
+                results[year].append(
+                    {
+                        "country": row[country_index],
+                        "quantity": int(row[quantity_index]),
+                        "amount": int(row[amount_index]),
+                        "year": year,
+                    }
+                )
+    return results
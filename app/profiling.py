@@ -0,0 +1,196 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+
+from fastapi import Header, HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+TOKEN = os.getenv("PROFILING_TOKEN", "")
+HEADER = "x-profile"
+INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.002"))
+SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+KEEP = int(os.getenv("PROFILING_KEEP", "20"))
+PROFILE_DIR = os.getenv("PROFILING_DIR", "")
+
+
+def fold(frame) -> str:
+    """Return a stack as root-first ``module:function`` frames joined by ;."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "?")
+        names.append(f"{module}:{code.co_qualname}".replace(";", ","))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """Samples the stack of one thread every ``interval`` seconds.
+
+    Profiled requests run on the event loop thread, so samples also catch
+    whatever else the loop runs meanwhile; time spent awaiting upstream
+    shows up as the loop waiting in ``select``.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+
+@dataclass
+class Profile:
+    id: str
+    method: str
+    path: str
+    started_at: float
+    duration: float
+    stacks: Counter = field(default_factory=Counter)
+
+    def folded(self) -> str:
+        """Return the samples in the folded format flame graph tools read."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": sum(self.stacks.values()),
+        }
+
+
+class SlowestProfiles:
+    """Keeps the ``size`` slowest profiles recorded so far."""
+
+    def __init__(self, size: int = 20):
+        self.size = size
+        self._heap: list[tuple[float, int, Profile]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile):
+        with self._lock:
+            item = (profile.duration, next(self._counter), profile)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            else:
+                heapq.heappushpop(self._heap, item)
+
+    def get(self, profile_id: str) -> Profile | None:
+        with self._lock:
+            for _, _, profile in self._heap:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def all(self) -> list[Profile]:
+        """Return the kept profiles, slowest first."""
+        with self._lock:
+            return [profile for _, _, profile in sorted(self._heap, reverse=True)]
+
+
+profiles = SlowestProfiles(KEEP)
+
+
+def is_admin(token: str | None) -> bool:
+    return bool(TOKEN) and token is not None and secrets.compare_digest(token, TOKEN)
+
+
+def require_admin(x_profile: str | None = Header(None)):
+    """Hide the debug routes unless profiling is on and the admin token is sent."""
+    if not ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not is_admin(x_profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+def save(profile: Profile):
+    path = os.path.join(PROFILE_DIR, f"{profile.id}.folded")
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(profile.folded())
+    except OSError as e:
+        logger.error("Failed to save profile %s: %s", path, e)
+
+
+class ProfilingMiddleware:
+    """Profile requests that carry the admin token in an X-Profile header.
+
+    Does nothing unless PROFILING_ENABLED is set. PROFILING_SAMPLE_RATE also
+    profiles that share of all requests, so slow ones are caught without the
+    header. Responses to the admin get an X-Profile-Id header. Every profile
+    is kept in ``profiles`` if it is among the slowest and written to
+    PROFILING_DIR as a .folded file when that is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = dict(scope["headers"]).get(HEADER.encode())
+        admin = is_admin(token.decode("latin-1") if token else None)
+        if not admin and not (SAMPLE_RATE and random.random() < SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def send_with_id(message):
+            if admin and message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode())
+                ]
+            await send(message)
+
+        sampler = Sampler(threading.get_ident(), INTERVAL)
+        started_at = time.time()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            profile = Profile(
+                id=profile_id,
+                method=scope["method"],
+                path=scope["path"],
+                started_at=started_at,
+                duration=time.perf_counter() - start,
+                stacks=sampler.stacks,
+            )
+            profiles.add(profile)
+            if PROFILE_DIR:
+                save(profile)
@@ -0,0 +1,220 @@
+import base64
+import binascii
+import bisect
+import os
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from app.matrix import SeriesMatrix
+from app.table import Table
+
+TRADE_FIELDS = ("country", "quantity", "amount", "year")
+
+
+class MatrixRows(Sequence):
+    """The rows of every year of a trade ``SeriesMatrix``, year after year.
+
+    Row dicts are built on access, shaped like ``SeriesMatrix.rows``.
+    """
+
+    def __init__(self, columns: dict[str, list]):
+        self._columns = columns
+
+    def __len__(self):
+        return len(self._columns["country"])
+
+    def __getitem__(self, position: int) -> dict:
+        return {field: self._columns[field][position] for field in TRADE_FIELDS}
+
+
+class RowIndex:
+    """Lookup structures over the import/export rows of a list, ``Table`` or matrix.
+
+    Rows are grouped by country, and every sort order is computed once and
+    memoised, so a filtered, sorted page costs the size of the selection
+    rather than a scan and sort of the whole list. Fields are read from
+    per-field columns, taken straight from a table. A ``SeriesMatrix`` is
+    indexed as the rows of all of its years, so every year range of it
+    shares one index.
+    """
+
+    def __init__(self, rows: list | Table | SeriesMatrix):
+        self.source = rows
+        if isinstance(rows, SeriesMatrix):
+            count = len(rows.years)
+            self.columns = {
+                "country": rows.names * count,
+                "quantity": rows.values["quantity"].T.ravel().tolist(),
+                "amount": rows.values["amount"].T.ravel().tolist(),
+                "year": rows.years.repeat(len(rows.names)).tolist(),
+            }
+            rows = MatrixRows(self.columns)
+        elif isinstance(rows, Table):
+            self.columns = rows.columns()
+        else:
+            self.columns = {
+                field: [row[field] for row in rows] for field in TRADE_FIELDS
+            }
+        self.rows = rows
+        self.countries: dict[str, list[int]] = {}
+        for position, country in enumerate(self.columns["country"]):
+            self.countries.setdefault(country.casefold(), []).append(position)
+        self._orders: dict[str, list[int]] = {}
+        self._ranks: dict[str, list[int]] = {}
+        self._quantities: list | None = None
+
+    def order(self, sort: str) -> list[int]:
+        """Return row positions sorted by a field, descending if it starts with -."""
+        if sort not in self._orders:
+            self._orders[sort] = sorted(
+                range(len(self.rows)),
+                key=self.columns[sort.lstrip("-")].__getitem__,
+                reverse=sort.startswith("-"),
+            )
+        return self._orders[sort]
+
+    def rank(self, sort: str) -> list[int]:
+        """Return the position of every row within ``order(sort)``."""
+        if sort not in self._ranks:
+            ranks = [0] * len(self.rows)
+            for rank, position in enumerate(self.order(sort)):
+                ranks[position] = rank
+            self._ranks[sort] = ranks
+        return self._ranks[sort]
+
+    def sorted_quantities(self) -> list:
+        """Return the quantities in ascending order, aligned with order("quantity")."""
+        if self._quantities is None:
+            quantities = self.columns["quantity"]
+            self._quantities = [
+                quantities[position] for position in self.order("quantity")
+            ]
+        return self._quantities
+
+    def select(
+        self,
+        countries: list[str] | None = None,
+        min_quantity: int | None = None,
+        sort: str | None = None,
+        span: range | None = None,
+    ) -> list[int]:
+        """Return the positions of the matching rows in the requested order.
+
+        ``span`` limits the selection to a range of positions.
+        """
+        positions = self._select(countries, min_quantity, sort)
+        if span is None:
+            return list(positions)
+        return [position for position in positions if position in span]
+
+    def _select(self, countries, min_quantity, sort):
+        if countries:
+            positions = sorted(
+                {
+                    position
+                    for country in countries
+                    for position in self.countries.get(country.casefold(), [])
+                }
+            )
+            if sort:
+                positions.sort(key=self.rank(sort).__getitem__)
+        elif sort in ("quantity", "-quantity") and min_quantity:
+            # Rows at or above min_quantity are a prefix or suffix of the order.
+            count = len(self.rows) - bisect.bisect_left(
+                self.sorted_quantities(), min_quantity
+            )
+            positions = self.order(sort)
+            if sort == "quantity":
+                return positions[len(positions) - count :]
+            return positions[:count]
+        elif sort:
+            positions = self.order(sort)
+        else:
+            positions = range(len(self.rows))
+
+        if min_quantity:
+            quantities = self.columns["quantity"]
+            positions = [
+                position
+                for position in positions
+                if quantities[position] >= min_quantity
+            ]
+        return positions
+
+
+_indexes: OrderedDict[int, RowIndex] = OrderedDict()
+INDEX_MAX_ENTRIES = int(os.getenv("QUERY_INDEX_MAX_ENTRIES", "256"))
+
+
+def index_for(rows: list | Table | SeriesMatrix) -> RowIndex:
+    """Return the index of some rows, building it on first use.
+
+    Indexes of tables and matrices are memoised by identity, as the result
+    cache and the CSV store hand them out unchanged until the data is
+    reloaded. Lists are usually built per request, so their index is not
+    kept.
+    """
+    if not isinstance(rows, (Table, SeriesMatrix)):
+        return RowIndex(rows)
+    index = _indexes.get(id(rows))
+    if index is not None and index.source is rows:
+        _indexes.move_to_end(id(rows))
+        return index
+    index = RowIndex(rows)
+    _indexes[id(rows)] = index
+    while len(_indexes) > INDEX_MAX_ENTRIES:
+        _indexes.popitem(last=False)
+    return index
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the offset a cursor points at, ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor {cursor}") from e
+    if offset < 0:
+        raise ValueError(f"Invalid cursor {cursor}")
+    return offset
+
+
+def query_rows(
+    rows: list | Table,
+    countries: list[str] | None = None,
+    min_quantity: int | None = None,
+    sort: str | None = None,
+    fields: list[str] | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    years: tuple[int, int] | None = None,
+) -> tuple[list, str | None]:
+    """Filter, sort, page and project import/export rows.
+
+    ``rows`` may also be a trade ``SeriesMatrix``, queried over the
+    ``years`` range (start and end year, inclusive).
+
+    Returns the page of rows and the cursor of the next page, or None when
+    this is the last one.
+    """
+    index = index_for(rows)
+    span = None
+    if isinstance(rows, SeriesMatrix):
+        columns = rows.columns(*years)
+        span = range(columns.start * len(rows.names), columns.stop * len(rows.names))
+    positions = index.select(countries, min_quantity, sort, span)
+    rows = index.rows
+    offset = decode_cursor(cursor) if cursor else 0
+    end = len(positions) if limit is None else offset + limit
+    page = positions[offset:end]
+    next_cursor = encode_cursor(end) if end < len(positions) else None
+    if fields:
+        columns = [(field, index.columns[field]) for field in fields]
+        return [
+            {field: column[position] for field, column in columns} for position in page
+        ], next_cursor
+    return [rows[position] for position in page], next_cursor
@@ -0,0 +1,205 @@
+import asyncio
+import gzip
+import hashlib
+import inspect
+import json
+import os
+from dataclasses import dataclass, field
+
+from fastapi import Request, Response
+
+from app import cache, services
+from app.table import jsonable
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+CLOSED_MAX_AGE = int(os.getenv("RESPONSE_MAX_AGE_CLOSED", "86400"))
+OPEN_MAX_AGE = int(os.getenv("RESPONSE_MAX_AGE_OPEN", "60"))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Bodies at least this large are compressed in a thread, off the event loop.
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "65536"))
+
+
+@dataclass
+class EncodedBody:
+    """A JSON body and the compressed variants produced for it so far.
+
+    ``fast`` bodies are not kept, so their variants are compressed at a
+    cheap level; stored bodies are compressed once at a high level.
+    """
+
+    body: bytes
+    etag: str
+    cache_control: str
+    variants: dict[str, bytes] = field(default_factory=dict)
+    headers: dict[str, str] = field(default_factory=dict)
+    source: tuple | None = None
+    fast: bool = False
+
+    def variant(self, encoding: str | None) -> bytes:
+        if encoding is None:
+            return self.body
+        if encoding not in self.variants:
+            self.variants[encoding] = compress(self.body, encoding, fast=self.fast)
+        return self.variants[encoding]
+
+    def variant_etag(self, encoding: str | None) -> str:
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+@dataclass
+class Page:
+    """One page of a paginated list and the cursor of the next page."""
+
+    items: list
+    next_cursor: str | None = None
+
+
+body_cache = cache.ResultCache(
+    max_entries=int(os.getenv("BODY_CACHE_MAX_ENTRIES", "1024")), stale_ttl=0
+)
+
+
+def encode_json(data) -> bytes:
+    """Encode data the way JSONResponse renders it, tables as their rows."""
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=jsonable,
+    ).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def compress(body: bytes, encoding: str, fast: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4 if fast else 9)
+    return gzip.compress(body, compresslevel=1 if fast else 9, mtime=0)
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Pick br or gzip from an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for value in accept_encoding.split(","):
+        coding, _, params = value.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Return True if an If-None-Match header matches etag."""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(
+        value.removeprefix("W/") == etag for value in candidates
+    )
+
+
+def request_key(request: Request) -> tuple:
+    return (request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+
+async def cached_json(
+    request: Request, dataset: str, year: int, load, category: str | None = None
+) -> Response:
+    """Serve a JSON body with a strong ETag, reusing encoded bodies.
+
+    Bodies for closed years are kept in ``body_cache`` for the dataset's
+    TTL and sent with a long Cache-Control, so a repeat request or a
+    matching If-None-Match is answered without calling ``load``. ``year``
+    is the newest year the response covers. ``load`` may return a ``Page``,
+    whose next cursor is sent in an X-Next-Cursor header.
+
+    Bodies built while the request is marked ``cache.degraded`` are sent
+    with ``no-cache`` and never stored. A stored body is dropped once
+    ``services.data_version`` of ``(dataset, category, year)`` changes: when
+    that result-cache entry is refreshed or expires, a CSV file is reloaded
+    or, on shared cache readers, a new version of the file is mapped.
+
+    Bodies of at least COMPRESSION_MIN_SIZE bytes are sent br or gzip
+    encoded when the client accepts it. Compressed variants are stored on
+    the cached body, so each is produced once; bodies that are not stored
+    are compressed at a cheap level. Bodies of COMPRESSION_THREAD_MIN_SIZE
+    bytes or more are compressed in a thread.
+    """
+    key = request_key(request)
+    source_key = (dataset, category, year)
+    entry = body_cache.get(key)
+    if entry is not None and entry.value.source != services.data_version(source_key):
+        body_cache.invalidate(key)
+        entry = None
+    if entry is not None:
+        body_cache.hits += 1
+        encoded = entry.value
+    else:
+        body_cache.misses += 1
+        token = cache.degraded.set(False)
+        try:
+            data = load()
+            if inspect.isawaitable(data):
+                data = await data
+            degraded = cache.degraded.get()
+        finally:
+            cache.degraded.reset(token)
+        extra_headers = {}
+        if isinstance(data, Page):
+            if data.next_cursor:
+                extra_headers["X-Next-Cursor"] = data.next_cursor
+            data = data.items
+        body = encode_json(data)
+        closed = cache.is_closed_year(year) and not degraded
+        max_age = CLOSED_MAX_AGE if closed else OPEN_MAX_AGE
+        encoded = EncodedBody(
+            body=body,
+            etag=make_etag(body),
+            cache_control="no-cache" if degraded else f"public, max-age={max_age}",
+            headers=extra_headers,
+            source=services.data_version(source_key),
+            fast=not closed,
+        )
+        if closed:
+            body_cache.set(key, encoded, ttl=cache.ttl_for(dataset, year))
+
+    encoding = None
+    if len(encoded.body) >= COMPRESSION_MIN_SIZE:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+
+    headers = {
+        "ETag": encoded.variant_etag(encoding),
+        "Cache-Control": encoded.cache_control,
+        "Vary": "Accept-Encoding",
+        **encoded.headers,
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, headers["ETag"]) or etag_matches(
+        if_none_match, encoded.etag
+    ):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if encoding in encoded.variants or len(encoded.body) < COMPRESSION_THREAD_MIN_SIZE:
+        content = encoded.variant(encoding)
+    else:
+        content = await asyncio.to_thread(encoded.variant, encoding)
+    return Response(content, media_type="application/json", headers=headers)
@@ -1,32 +1,244 @@
 from datetime import timedelta
-from typing import Literal, Annotated
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Path
-from app import services
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, Path
+from app import bulk, cache, metrics, profiling, query, responses, services, warmer
+from app.csv_store import store
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from pydantic import TypeAdapter, ValidationError
+import asyncio
+import inspect
+import logging
 import os
 
 from app.auth import (
-    authenticate_user,
+    authenticate_user_async,
     create_access_token,
     fake_users_db,
-    get_current_active_user,
+    get_current_active_client,
 )
-from app.models import Token
+from app.models import (
+    FIRST_YEAR,
+    LAST_TRADE_YEAR,
+    LAST_YEAR,
+    DATASETS,
+    PUBLIC_DATASETS,
+    BatchRequest,
+    BatchSpec,
+    DatasetName,
+    ExportCategory,
+    ImportCategory,
+    ProcessingCategory,
+    StatsMetric,
+    StatsOperation,
+    Token,
+    TradeQuery,
+    TradeSort,
+)
+
+logger = logging.getLogger(__name__)
 
 
 api_router = APIRouter(
     prefix="/v1",
     responses={404: {"description": "Not found"}},
-    dependencies=[Depends(get_current_active_user)],
+    dependencies=[Depends(get_current_active_client)],
 )
 auth_router = APIRouter(prefix="/auth", responses={404: {"description": "Not found"}})
+health_router = APIRouter(tags=["health"])
+debug_router = APIRouter(
+    prefix="/debug",
+    include_in_schema=False,
+    dependencies=[Depends(profiling.require_admin)],
+)
+
+
+@health_router.get("/health", summary="Return service and upstream health")
+async def health():
+    """
+    Report the upstream circuit breakers and the result cache
+
+    Returns:
+    - **status**: "ok", or "degraded" while any breaker is not closed
+    - **upstream**: Circuit breaker state per vitibrasil dataset
+    - **held_tables**: Scraped tables that share no row with their snapshot,
+      with how many times in a row they were scraped
+    """
+    upstream = {
+        name: breaker.snapshot() for name, breaker in services.upstream_breakers.items()
+    }
+    degraded = any(state["state"] != "closed" for state in upstream.values())
+    return {
+        "status": "degraded" if degraded else "ok",
+        "upstream": upstream,
+        "cache": cache.result_cache.stats(),
+        "coalescing": services.upstream_flight.stats(),
+        "warmer": warmer.warmer.stats() if warmer.enabled() else None,
+        "held_tables": [
+            {"dataset": dataset, "category": category, "year": year, "seen": seen}
+            for (dataset, category, year), (_, seen) in services.held_tables.items()
+        ],
+    }
+
+
+def cache_requests():
+    return {
+        (name, result): getattr(result_cache, attribute)
+        for name, result_cache in (
+            ("result", cache.result_cache),
+            ("body", responses.body_cache),
+        )
+        for result, attribute in (
+            ("hit", "hits"),
+            ("stale_hit", "stale_hits"),
+            ("miss", "misses"),
+        )
+    }
+
+
+def cache_hit_ratio():
+    ratios = {}
+    for name, result_cache in (
+        ("result", cache.result_cache),
+        ("body", responses.body_cache),
+    ):
+        total = result_cache.hits + result_cache.stale_hits + result_cache.misses
+        ratios[(name,)] = (
+            (result_cache.hits + result_cache.stale_hits) / total if total else 0.0
+        )
+    return ratios
+
+
+metrics.Collector(
+    "cache_requests",
+    "Cache lookups by cache and result.",
+    ("cache", "result"),
+    cache_requests,
+    kind="counter",
+)
+metrics.Collector(
+    "cache_hit_ratio",
+    "Share of cache lookups served from the cache, stale hits included.",
+    ("cache",),
+    cache_hit_ratio,
+)
+
+
+@health_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Return the service metrics in the Prometheus text format"""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def year_range(start_year: int | None, end_year: int | None, last_year: int):
+    """Return the (start, end) years of a series query, or None for one year."""
+    if start_year is None and end_year is None:
+        return None
+    start_year = FIRST_YEAR if start_year is None else start_year
+    end_year = last_year if end_year is None else end_year
+    if start_year > end_year:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="start_year must not be after end_year",
+        )
+    return start_year, end_year
+
+
+def trade_query(
+    country: list[str] | None = Query(
+        None, description="Only this country; repeat it for several countries"
+    ),
+    min_quantity: int | None = Query(
+        None, ge=0, description="Only rows with at least this quantity"
+    ),
+    sort: TradeSort | None = Query(
+        None, description="Field to sort by, prefixed with - for descending"
+    ),
+    fields: str | None = Query(
+        None, description="Comma separated fields to return, all by default"
+    ),
+    limit: int | None = Query(None, ge=1, le=1000, description="Rows per page"),
+    cursor: str | None = Query(None, description="X-Next-Cursor of the last page"),
+) -> TradeQuery:
+    countries = [name.strip() for name in country or [] if name.strip()]
+    field_names = [name.strip() for name in fields.split(",")] if fields else []
+    unknown = [name for name in field_names if name not in query.TRADE_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown fields: {', '.join(unknown)}",
+        )
+    if cursor:
+        try:
+            query.decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+            )
+    return TradeQuery(
+        countries=countries,
+        min_quantity=min_quantity,
+        sort=sort,
+        fields=field_names,
+        limit=limit,
+        cursor=cursor,
+    )
+
+
+def query_page(rows, params: TradeQuery, years: tuple[int, int] | None = None):
+    """Return the page of rows ``params`` asks for."""
+    items, next_cursor = query.query_rows(
+        rows,
+        countries=params.countries,
+        min_quantity=params.min_quantity,
+        sort=params.sort,
+        fields=params.fields,
+        limit=params.limit,
+        cursor=params.cursor,
+        years=years,
+    )
+    return responses.Page(items, next_cursor)
+
+
+def paginated(load, params: TradeQuery):
+    """Wrap a rows loader so it returns the page of rows ``params`` asks for."""
+    if params.is_empty():
+        return load
+
+    async def load_page():
+        rows = load()
+        if inspect.isawaitable(rows):
+            rows = await rows
+        return query_page(rows, params)
+
+    return load_page
+
+
+def paginated_series(
+    dataset: str, category: str, years: tuple[int, int], params: TradeQuery
+):
+    """Return a loader of the rows of a year range, paged through its matrix."""
+    if params.is_empty():
+        return lambda: services.series_data(dataset, *years, category=category)
+
+    def load_page():
+        matrix = services.series_matrix(dataset, category)
+        if matrix is None:
+            return responses.Page([])
+        return query_page(matrix, params, years)
+
+    return load_page
 
 
 @auth_router.post("/token")
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
-    user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+    user = await authenticate_user_async(
+        fake_users_db, form_data.username, form_data.password
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,12 +256,25 @@ async def login_for_access_token(
 
 @api_router.get("/production", summary="Return production data")
 async def production(
+    request: Request,
     year: int = Query(
         2023,
-        ge=1970,
-        le=2023,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
         description="Year of production data (must be between 1970 and 2023)",
-    )
+    ),
+    start_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
+        description="First year of a production series",
+    ),
+    end_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
+        description="Last year of a production series",
+    ),
 ):
     """
     Retrieve wines, juices, and derivates production statistics in Rio Grande
@@ -57,45 +282,91 @@ async def production(
 
     Parameters:
     - **year**: Year of production data (defaults to 2023)
+    - **start_year**, **end_year**: Return every year in this range instead
 
     Returns:
     - Production volume and type statistics from Embrapa's database
     """
-    return services.production_data(year)
+    years = year_range(start_year, end_year, LAST_YEAR)
+    if years:
+        return await responses.cached_json(
+            request,
+            "producao",
+            years[1],
+            lambda: services.series_data("producao", *years),
+        )
+    return await responses.cached_json(
+        request, "producao", year, lambda: services.production_data(year)
+    )
 
 
 @api_router.get("/commercialization", summary="Return commercialization data")
 async def commercialization(
+    request: Request,
     year: int = Query(
         2023,
-        ge=1970,
-        le=2023,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
         description="Year of commercialization data (must be between 1970 and 2023)",
-    )
+    ),
+    start_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
+        description="First year of a commercialization series",
+    ),
+    end_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
+        description="Last year of a commercialization series",
+    ),
 ):
     """
     Retrieve wines, juices, and derivatives commercialization statistics for Rio Grande do Sul market
 
     Parameters:
     - **year**: Year of commercialization data (defaults to 2023)
+    - **start_year**, **end_year**: Return every year in this range instead
 
     Returns:
     - Commercialization volume and type statistics from Embrapa's database
     """
-    return services.commercialization_data(year)
+    years = year_range(start_year, end_year, LAST_YEAR)
+    if years:
+        return await responses.cached_json(
+            request,
+            "comercializacao",
+            years[1],
+            lambda: services.series_data("comercializacao", *years),
+        )
+    return await responses.cached_json(
+        request, "comercializacao", year, lambda: services.commercialization_data(year)
+    )
 
 
 @api_router.get("/processing/{category}", summary="Return processing data")
 async def processing(
-    category: Literal[
-        "viniferas", "americanas-e-hibridas", "uva-de-mesa", "sem-classificacao"
-    ],
+    request: Request,
+    category: ProcessingCategory,
     year: int = Query(
         2023,
-        ge=1970,
-        le=2023,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
         description="Year of processing data (must be between 1970 and 2023)",
     ),
+    start_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
+        description="First year of a processing series",
+    ),
+    end_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_YEAR,
+        description="Last year of a processing series",
+    ),
 ):
     """
     Get data about grape processing categorized by type
@@ -103,21 +374,48 @@ async def processing(
     Parameters:
     - **category**: Type of grape being processed (path parameter with predefined options)
     - **year**: Year of the data in question (default: 2023)
+    - **start_year**, **end_year**: Return every year in this range instead
     """
-    return services.processing_data(year, metadata={"category": category})
+    years = year_range(start_year, end_year, LAST_YEAR)
+    if years:
+        return await responses.cached_json(
+            request,
+            "processamento",
+            years[1],
+            lambda: services.series_data("processamento", *years, category=category),
+        )
+    return await responses.cached_json(
+        request,
+        "processamento",
+        year,
+        lambda: services.processing_data(year, metadata={"category": category}),
+        category=category,
+    )
 
 
 @api_router.get("/import/{category}", summary="Return import data by category")
 async def importation(
-    category: Literal[
-        "vinhos-de-mesa", "espumantes", "uvas-frescas", "uvas-passas", "suco-de-uva"
-    ],
+    request: Request,
+    category: ImportCategory,
     year: int = Query(
         2024,
-        ge=1970,
-        le=2024,
+        ge=FIRST_YEAR,
+        le=LAST_TRADE_YEAR,
         description="Year of importation data (must be between 1970 and 2023)",
     ),
+    start_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_TRADE_YEAR,
+        description="First year of an import series",
+    ),
+    end_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_TRADE_YEAR,
+        description="Last year of an import series",
+    ),
+    params: TradeQuery = Depends(trade_query),
 ):
     """
     Retrieve data about imported grape derivatives products
@@ -125,19 +423,54 @@ async def importation(
     Parameters:
     - **category**: Import category (one of five predefined options)
     - **year**: Year of data collection (default: 2024)
+    - **start_year**, **end_year**: Return every year in this range instead
+    - **country**, **min_quantity**, **sort**, **fields**: Filter, order and
+      project the rows
+    - **limit**, **cursor**: Page through the rows; the cursor of the next
+      page is sent in the X-Next-Cursor header
     """
-    return services.import_data(year, metadata={"category": category})
+    years = year_range(start_year, end_year, LAST_TRADE_YEAR)
+    if years:
+        return await responses.cached_json(
+            request,
+            "importacao",
+            years[1],
+            paginated_series("importacao", category, years, params),
+        )
+    return await responses.cached_json(
+        request,
+        "importacao",
+        year,
+        paginated(
+            lambda: services.import_data(year, metadata={"category": category}), params
+        ),
+        category=category,
+    )
 
 
 @api_router.get("/export/{category}", summary="Return export data by category")
 async def export(
-    category: Literal["vinhos-de-mesa", "espumantes", "uvas-frescas", "suco-de-uva"],
+    request: Request,
+    category: ExportCategory,
     year: int = Query(
         2024,
-        ge=1970,
-        le=2024,
+        ge=FIRST_YEAR,
+        le=LAST_TRADE_YEAR,
         description="Year of importation data (must be between 1970 and 2023)",
     ),
+    start_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_TRADE_YEAR,
+        description="First year of an export series",
+    ),
+    end_year: int | None = Query(
+        None,
+        ge=FIRST_YEAR,
+        le=LAST_TRADE_YEAR,
+        description="Last year of an export series",
+    ),
+    params: TradeQuery = Depends(trade_query),
 ):
     """
     Retrieve data about exported grape derivatives products
@@ -145,5 +478,262 @@ async def export(
     Parameters:
     - **category**: Export type subcategory (four available options)
     - **year**: Year of export data (default: 2024)
+    - **start_year**, **end_year**: Return every year in this range instead
+    - **country**, **min_quantity**, **sort**, **fields**: Filter, order and
+      project the rows
+    - **limit**, **cursor**: Page through the rows; the cursor of the next
+      page is sent in the X-Next-Cursor header
+    """
+    years = year_range(start_year, end_year, LAST_TRADE_YEAR)
+    if years:
+        return await responses.cached_json(
+            request,
+            "exportacao",
+            years[1],
+            paginated_series("exportacao", category, years, params),
+        )
+    return await responses.cached_json(
+        request,
+        "exportacao",
+        year,
+        paginated(
+            lambda: services.export_data(year, metadata={"category": category}), params
+        ),
+        category=category,
+    )
+
+
+batch_spec_adapter = TypeAdapter(BatchSpec)
+
+
+async def resolve_spec(spec):
+    if spec.dataset == "production":
+        return await services.production_data(spec.year)
+    if spec.dataset == "commercialization":
+        return await services.commercialization_data(spec.year)
+    metadata = {"category": spec.category}
+    if spec.dataset == "processing":
+        return await services.processing_data(spec.year, metadata=metadata)
+    if spec.dataset == "import":
+        return await services.import_data(spec.year, metadata=metadata)
+    return await services.export_data(spec.year, metadata=metadata)
+
+
+@api_router.post("/batch", summary="Return several datasets in one call")
+async def batch(request: BatchRequest):
+    """
+    Resolve many dataset lookups concurrently
+
+    Parameters:
+    - **items**: Up to 50 objects with a **dataset** (production,
+      commercialization, processing, import or export), a **category** for
+      the datasets that have one, and a **year**. Each item follows the same
+      rules as the matching single-item route.
+
+    Returns:
+    - One result per item, in order, with its own **status**: 200 and the
+      **data**, 422 and the validation **error**, or 500.
+    """
+    semaphore = asyncio.Semaphore(int(os.getenv("BATCH_CONCURRENCY", "8")))
+
+    async def run(item: dict):
+        try:
+            spec = batch_spec_adapter.validate_python(item)
+        except ValidationError as e:
+            return {
+                "request": item,
+                "status": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "error": e.errors(include_url=False, include_context=False),
+            }
+        async with semaphore:
+            try:
+                data = await resolve_spec(spec)
+            except Exception:
+                logger.exception("Batch item failed: %s", item)
+                return {
+                    "request": spec.model_dump(),
+                    "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    "error": "Internal error",
+                }
+        return {
+            "request": spec.model_dump(),
+            "status": status.HTTP_200_OK,
+            "data": data.to_rows(),
+        }
+
+    return {"results": await asyncio.gather(*(run(item) for item in request.items))}
+
+
+@api_router.get("/export-bulk/{dataset}", summary="Stream a full dataset history")
+async def export_bulk(
+    request: Request,
+    dataset: DatasetName,
+    start_year: int | None = Query(
+        None, ge=FIRST_YEAR, le=LAST_TRADE_YEAR, description="First year to export"
+    ),
+    end_year: int | None = Query(
+        None, ge=FIRST_YEAR, le=LAST_TRADE_YEAR, description="Last year to export"
+    ),
+):
+    """
+    Stream every category and year of a dataset from the local CSV data
+
+    Parameters:
+    - **dataset**: production, commercialization, processing, import or export
+    - **start_year**, **end_year**: Limit the export to this range of years
+
+    Returns:
+    - NDJSON, one row per line, or CSV when the Accept header asks for
+      text/csv. Rows are streamed a category and year at a time.
+    """
+    name, last_year = DATASETS[dataset]
+    start_year, end_year = year_range(start_year, end_year, last_year) or (
+        FIRST_YEAR,
+        last_year,
+    )
+    if "text/csv" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            bulk.iter_csv(name, start_year, end_year),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{dataset}.csv"'},
+        )
+    return StreamingResponse(
+        bulk.iter_ndjson(name, start_year, end_year),
+        media_type="application/x-ndjson",
+    )
+
+
+def stats_results(
+    dataset: DatasetName,
+    category: str | None,
+    op: StatsOperation,
+    metric: StatsMetric | None,
+    years: tuple[int, int],
+    limit: int,
+    name: str | None,
+):
+    internal, _ = DATASETS[dataset]
+    stats = store.stats(internal, category)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Unknown dataset category")
+    metric = metric or ("amount" if "amount" in stats.totals else "quantity")
+    if metric not in stats.totals:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{dataset} has no {metric} metric",
+        )
+
+    start_year, end_year = years
+    if op == "sum":
+        results = stats.sum(start_year, end_year)
+    elif op == "growth":
+        try:
+            results = stats.growth(metric, start_year, end_year, name)
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Unknown name {name}")
+    elif op == "share":
+        results = stats.share(metric, start_year, end_year, limit)
+    else:
+        results = stats.top(metric, start_year, end_year, limit)
+    return {
+        "dataset": dataset,
+        "category": category,
+        "op": op,
+        "metric": metric,
+        "start_year": start_year,
+        "end_year": end_year,
+        "results": results,
+    }
+
+
+@api_router.get("/stats/{dataset}", summary="Aggregate a dataset")
+@api_router.get("/stats/{dataset}/{category}", summary="Aggregate a dataset category")
+async def get_stats(
+    request: Request,
+    dataset: DatasetName,
+    category: str | None = None,
+    op: StatsOperation = Query("top", description="top, sum, growth or share"),
+    metric: StatsMetric | None = Query(
+        None, description="Metric to aggregate, amount by default for trade data"
+    ),
+    year: int | None = Query(None, ge=FIRST_YEAR, le=LAST_TRADE_YEAR),
+    start_year: int | None = Query(None, ge=FIRST_YEAR, le=LAST_TRADE_YEAR),
+    end_year: int | None = Query(None, ge=FIRST_YEAR, le=LAST_TRADE_YEAR),
+    limit: int = Query(10, ge=1, le=500, description="Rows returned by top/share"),
+    name: str | None = Query(None, description="Item or country for growth"),
+):
     """
-    return services.export_data(year, metadata={"category": category})
+    Aggregate the local CSV data of a dataset
+
+    Parameters:
+    - **dataset**: production, commercialization, processing, import or export
+    - **category**: Required for processing, import and export
+    - **op**: "top" ranks items or countries, "sum" totals every metric per
+      year, "growth" gives the year-over-year change of the total (or of
+      **name**) and "share" adds the rest of the total as "Others"
+    - **year**, or **start_year** and **end_year**: Years to aggregate,
+      the dataset's last year by default
+
+    Returns:
+    - The query echoed back with its **results**.
+    """
+    internal, last_year = DATASETS[dataset]
+    years = year_range(start_year, end_year, last_year)
+    if years is None:
+        year = last_year if year is None else year
+        years = (year, year)
+    return await responses.cached_json(
+        request,
+        internal,
+        years[1],
+        lambda: stats_results(dataset, category, op, metric, years, limit, name),
+    )
+
+
+@api_router.get("/changes", summary="Return rows revised upstream since a version")
+async def get_changes(
+    since: int = Query(0, ge=0, description="Version returned by the last call"),
+    dataset: DatasetName | None = Query(None, description="Only this dataset"),
+    limit: int = Query(1000, ge=1, le=10000, description="Changes per call"),
+):
+    """
+    List the rows that changed between successive scrapes of a vitibrasil page
+
+    Parameters:
+    - **since**: Return changes after this version, 0 for all of them
+    - **dataset**: production, commercialization, processing, import or export
+    - **limit**: Maximum number of changes returned
+
+    Returns:
+    - The **changes**, oldest first, each with its **version**, table
+      (**dataset**, **category**, **year**), item or country **name**, whether
+      the row was **added**, **removed** or **changed**, and the **row** and
+      **previous** row. Pass **version** as **since** on the next call; when
+      **more** is true, further changes are waiting.
+    """
+    if not services.snapshots:
+        raise HTTPException(status_code=404, detail="Change tracking is disabled")
+    changes, version, more = await asyncio.to_thread(
+        services.snapshots.changes,
+        since,
+        limit,
+        DATASETS[dataset][0] if dataset else None,
+    )
+    for change in changes:
+        change["dataset"] = PUBLIC_DATASETS[change["dataset"]]
+    return {"since": since, "version": version, "more": more, "changes": changes}
+
+
+@debug_router.get("/profiles")
+async def list_profiles():
+    """List the slowest profiled requests, slowest first"""
+    return [profile.summary() for profile in profiling.profiles.all()]
+
+
+@debug_router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Return one profile as folded stacks, for flamegraph.pl or speedscope"""
+    profile = profiling.profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
@@ -1,9 +1,18 @@
-import requests
+import httpx
 import logging
+import os
+import re
 from bs4 import BeautifulSoup
+from dataclasses import dataclass
+from html.parser import HTMLParser
+import time
+
+from app import logs, metrics
 
 logger = logging.getLogger(__name__)
 
+_client: httpx.AsyncClient | None = None
+
 SCRAPER_TARGETS = {
     "processamento": {
         "viniferas": "http://vitibrasil.cnpuv.embrapa.br/index.php?subopcao=subopt_01&opcao=opt_03",
@@ -29,18 +38,100 @@ SCRAPER_TARGETS = {
 }
 
 
-def get_data(url: str) -> str:
-    """Fetch data from a given URL."""
+def target_name(url: str) -> str:
+    """Return the SCRAPER_TARGETS name of a page URL, used as a metric label.
+
+    Looked up on every call, so targets pointed at another host are named.
+    """
+    base_url = url.split("&ano=")[0]
+    for dataset, target in SCRAPER_TARGETS.items():
+        if not isinstance(target, dict):
+            target = {None: target}
+        for category, target_url in target.items():
+            if target_url == base_url:
+                return f"{dataset}/{category}" if category else dataset
+    return "other"
+
+
+def create_client() -> httpx.AsyncClient:
+    """Build the shared keep-alive client used for every upstream request."""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "10")),
+        max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30")),
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv("UPSTREAM_TIMEOUT", "10")),
+        pool=float(os.getenv("UPSTREAM_POOL_TIMEOUT", "5")),
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+async def start_client():
+    """Open the shared upstream client. Called once at app startup."""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+async def close_client():
+    """Close the shared upstream client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@dataclass
+class Page:
+    content: str | None
+    etag: str | None = None
+    last_modified: str | None = None
+    not_modified: bool = False
+
+
+async def fetch_page(
+    url: str, etag: str | None = None, last_modified: str | None = None
+) -> Page | None:
+    """Fetch a page, revalidating with the given validators when present.
+
+    Returns a Page with ``not_modified`` set when upstream answers 304, and
+    None when the request fails.
+    """
     if not url:
         raise ValueError("URL is required")
 
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    client = _client or await start_client()
+    start = time.perf_counter()
+    outcome = "error"
     try:
-        response = requests.get(url, timeout=10)
+        response = await client.get(url, headers=headers)
+        if response.status_code == 304:
+            outcome = "not_modified"
+            return Page(
+                content=None, etag=etag, last_modified=last_modified, not_modified=True
+            )
         response.raise_for_status()
-        return response.content.decode("utf-8")
-    except requests.RequestException as e:
-        logger.error(f"Failed to fetch data from {url}: {str(e)}")
+        outcome = "ok"
+        return Page(
+            content=response.content.decode("utf-8"),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+    except httpx.HTTPError as e:
+        logger.error("Failed to fetch data from %s: %s", url, e)
         return None
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.UPSTREAM_SECONDS.labels(target_name(url), outcome).observe(elapsed)
+        logs.record_upstream(elapsed)
 
 
 def parse_str_to_number(str):
@@ -51,71 +142,200 @@ def parse_str_to_number(str):
         return 0
 
 
-def parse_html_table(year=2023, html_content=None, metadata: dict = {}):
-    logger.info("Request html")
-    if not html_content:
-        return []
+class _TableRowsParser(HTMLParser):
+    """Collect the cells of the first tbody of a table from a token stream.
+
+    Each row becomes a list of ``(first class, text)`` tuples, where text
+    matches BeautifulSoup's ``get_text(strip=True)`` for the cell. Parsing
+    stops being useful once the outer table closes.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.found_tbody = False
+        self._table_depth = 0
+        self._in_tbody = False
+        self._row = None
+        self._cell_class = None
+        self._cell_parts = None
+        self._data = []
+
+    def _flush_data(self):
+        if self._cell_parts is not None and self._data:
+            text = "".join(self._data).strip()
+            if text:
+                self._cell_parts.append(text)
+        self._data = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_data()
+        if tag == "table":
+            self._table_depth += 1
+        elif self._table_depth != 1:
+            return
+        elif tag == "tbody" and not self.found_tbody:
+            self.found_tbody = self._in_tbody = True
+        elif tag == "tr" and self._in_tbody:
+            self._row = []
+        elif tag == "td" and self._row is not None:
+            classes = (dict(attrs).get("class") or "").split()
+            self._cell_class = classes[0] if classes else None
+            self._cell_parts = []
+
+    def handle_endtag(self, tag):
+        self._flush_data()
+        if tag == "table":
+            self._table_depth -= 1
+        elif self._table_depth != 1:
+            return
+        elif tag == "tbody":
+            self._in_tbody = False
+        elif tag == "tr" and self._row is not None:
+            if self._row:
+                self.rows.append(self._row)
+            self._row = None
+        elif tag == "td" and self._cell_parts is not None:
+            self._row.append((self._cell_class, "".join(self._cell_parts)))
+            self._cell_parts = None
+
+    def handle_data(self, data):
+        if self._cell_parts is not None:
+            self._data.append(data)
+
+
+_DATA_TABLE_RE = re.compile(
+    r"<table\b[^>]*\bclass\s*=\s*[\"']tb_base tb_dados[\"']", re.IGNORECASE
+)
+_TABLE_END_RE = re.compile(r"</table\s*>", re.IGNORECASE)
+_TABLE_START_RE = re.compile(r"<table\b", re.IGNORECASE)
+
+
+def _find_data_table(html_content: str):
+    for match in _DATA_TABLE_RE.finditer(html_content):
+        comment_start = html_content.rfind("<!--", 0, match.start())
+        if (
+            comment_start == -1
+            or html_content.rfind("-->", comment_start, match.start()) != -1
+        ):
+            return match
+    return None
+
+
+def _extract_rows_fast(html_content: str):
+    match = _find_data_table(html_content)
+    if not match:
+        return None
+
+    start = match.start()
+    end = _TABLE_END_RE.search(html_content, match.end())
+    fragment = html_content[start : end.end()] if end else html_content[start:]
+    if len(_TABLE_START_RE.findall(fragment)) > 1:
+        # Nested tables: let the tokenizer find the matching close tag.
+        fragment = html_content[start:]
+
+    parser = _TableRowsParser()
+    parser.feed(fragment)
+    parser.close()
+    return parser.rows if parser.found_tbody else []
 
+
+def _extract_rows_bs4(html_content: str):
     soup = BeautifulSoup(html_content, "html.parser")
     table = soup.find("table", {"class": "tb_base tb_dados"})
 
     if not table:
+        return None
+
+    rows = []
+    for row in table.find_all("tbody")[0].find_all("tr"):
+        rows.append(
+            [
+                ((cell.get("class") or [None])[0], cell.get_text(strip=True))
+                for cell in row.find_all("td")
+            ]
+        )
+    return rows
+
+
+PARSER_ENGINES = {"fast": _extract_rows_fast, "bs4": _extract_rows_bs4}
+
+
+def extract_table_rows(html_content: str, engine: str | None = None):
+    """Return the data table body rows as lists of (class, text) cells.
+
+    ``engine`` picks the extractor: "fast" tokenizes only the data table,
+    "bs4" builds a BeautifulSoup tree of the whole page. Defaults to the
+    PARSER_ENGINE setting. Returns None when the page has no data table.
+    """
+    engine = engine or os.getenv("PARSER_ENGINE", "fast")
+    return PARSER_ENGINES[engine](html_content)
+
+
+@metrics.timed(metrics.PARSE_SECONDS, "parse_html_table")
+def parse_html_table(
+    year=2023, html_content=None, metadata: dict = {}, engine: str | None = None
+):
+    logger.debug("Request html")
+    if not html_content:
+        return []
+
+    rows = extract_table_rows(html_content, engine)
+
+    if rows is None:
         logger.warning("Table not found in HTML content")
         return []
 
     results = []
-    rows = table.find_all("tbody")[0].find_all("tr")
 
-    for row in rows:
-        cells = row.find_all("td")
-
-        if cells[0].get("class")[0] == "tb_item":
+    for cells in rows:
+        if len(cells) < 2:
+            continue
+        if cells[0][0] == "tb_item":
             item = {
-                "item": cells[0].get_text(strip=True),
-                "quantity": parse_str_to_number(cells[1].get_text(strip=True)),
+                "item": cells[0][1],
+                "quantity": parse_str_to_number(cells[1][1]),
                 "year": year,
                 "sub_items": [],
             }
             item.update(metadata)
             results.append(item)
 
-        if (
-            cells[0].get("class")[0] == "tb_subitem"
-            and cells[1].get("class")[0] == "tb_subitem"
-        ):
+        if cells[0][0] == "tb_subitem" and cells[1][0] == "tb_subitem" and results:
             results[-1]["sub_items"].append(
                 {
-                    "name": cells[0].get_text(strip=True),
-                    "quantity": parse_str_to_number(cells[1].get_text(strip=True)),
+                    "name": cells[0][1],
+                    "quantity": parse_str_to_number(cells[1][1]),
                 }
             )
 
     return results
 
 
-def parse_import_export_table(year=2023, html_content=None, metadata: dict = {}):
-    logger.info("Request html")
+@metrics.timed(metrics.PARSE_SECONDS, "parse_import_export_table")
+def parse_import_export_table(
+    year=2023, html_content=None, metadata: dict = {}, engine: str | None = None
+):
+    logger.debug("Request html")
     """Parse import/export specific table data."""
     if not html_content:
         return []
 
-    soup = BeautifulSoup(html_content, "html.parser")
-    table = soup.find("table", {"class": "tb_base tb_dados"})
+    rows = extract_table_rows(html_content, engine)
 
-    if not table:
+    if rows is None:
         logger.warning("Table not found in HTML content")
         return []
 
     results = []
-    rows = table.find_all("tbody")[0].find_all("tr")
-
-    for row in rows:
-        cells = row.find_all("td")
 
+    for cells in rows:
+        if len(cells) < 3:
+            continue
         item = {
-            "country": cells[0].get_text(strip=True),
-            "quantity": parse_str_to_number(cells[1].get_text(strip=True)),
-            "amount": parse_str_to_number(cells[2].get_text(strip=True)),
+            "country": cells[0][1],
+            "quantity": parse_str_to_number(cells[1][1]),
+            "amount": parse_str_to_number(cells[2][1]),
             "year": year,
         }
         item.update(metadata)
@@ -1,87 +1,305 @@
-from app.parser_csv import general_csv, import_export_csv
-from app import scraping
+from app import cache, changes, metrics, scraping, shared, snapshot
+from app.circuit import CircuitBreaker
+from app.csv_store import store
+from app.singleflight import SingleFlight
+from app.table import TRADE_DATASETS, Table, kind_for
+import asyncio
+import hashlib
+import logging
 import os
+import time
 
+logger = logging.getLogger(__name__)
 
-def production_data(year: int = 2023):
-    html_content = scraping.get_data(
-        url=f"{scraping.SCRAPER_TARGETS['producao']}&ano={year}"
+upstream_flight = SingleFlight()
+upstream_breakers = {
+    dataset: CircuitBreaker(
+        dataset,
+        failure_threshold=float(os.getenv("BREAKER_FAILURE_THRESHOLD", "0.5")),
+        window=int(os.getenv("BREAKER_WINDOW", "20")),
+        min_calls=int(os.getenv("BREAKER_MIN_CALLS", "5")),
+        open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
     )
+    for dataset in scraping.SCRAPER_TARGETS
+}
+snapshots = snapshot.create_store()
+# (dataset, category, year) -> (rows, times scraped) of a table that shares
+# no row with its snapshot. It replaces the snapshot once the same rows were
+# scraped TABLE_REPLACE_AFTER times in a row.
+held_tables: dict[tuple, tuple[list, int]] = {}
+TABLE_REPLACE_AFTER = int(os.getenv("TABLE_REPLACE_AFTER", "3"))
+shared_cache = shared.create_cache()
 
-    if html_content:
-        return scraping.parse_html_table(year=year, html_content=html_content)
-    else:
-        return general_csv(
-            path=f"{os.getcwd()}/files/producao.csv",
-            year=year,
-            key="produto",
-        )
 
+def table_loader(dataset: str, year: int, category: str | None = None):
+    """Return the cache key, loader and TTL for one upstream table.
 
-def commercialization_data(year: int = 2023):
-    html_content = scraping.get_data(
-        url=f"{scraping.SCRAPER_TARGETS['comercializacao']}&ano={year}"
-    )
+    The loader fetches and parses the page into a ``Table``, sharing one
+    fetch and parse between concurrent callers through ``upstream_flight``.
+    With a snapshot store configured, the fetch is a conditional GET
+    against the stored validators and an unchanged page is not parsed
+    again; the stored rows are also used when the fetch fails. Rows that
+    differ from the stored version are logged in the store's changes. The
+    loader returns None when there is neither a fresh page nor a snapshot.
+    A page that parses to an empty table counts as a failed fetch and leaves
+    the snapshot as it was. A table without any row of the stored one is
+    held in ``held_tables`` and the snapshot served instead, until the same
+    rows were scraped TABLE_REPLACE_AFTER times in a row. Snapshot reads and
+    writes run in a thread, off the event loop.
+    """
+    target = scraping.SCRAPER_TARGETS[dataset]
+    target_url = target[category] if category else target
+    key = (dataset, category, year)
+    breaker = upstream_breakers[dataset]
+    kind = kind_for(dataset)
 
-    if html_content:
-        return scraping.parse_html_table(year=year, html_content=html_content)
-    else:
-        return general_csv(
-            path=f"{os.getcwd()}/files/comercializacao.csv",
-            year=year,
-            key="Produto",
+    async def revalidate(stored):
+        """Fetch, parse and store the page; return the table and whether it worked."""
+        page = await scraping.fetch_page(
+            url=f"{target_url}&ano={year}",
+            etag=stored.etag if stored else None,
+            last_modified=stored.last_modified if stored else None,
         )
+        if page is None or not (page.not_modified or page.content):
+            return (Table.from_rows(stored.data, year, kind) if stored else None), False
 
+        now = time.time()
+        if page.not_modified:
+            await asyncio.to_thread(snapshots.touch, target_url, year, now)
+            return Table.from_rows(stored.data, year, kind), True
+        content_hash = hashlib.sha256(page.content.encode("utf-8")).hexdigest()
+        if stored and stored.content_hash == content_hash:
+            await asyncio.to_thread(snapshots.touch, target_url, year, now)
+            return Table.from_rows(stored.data, year, kind), True
 
-def processing_data(year: int = 2023, metadata: dict = {}):
-    category = metadata["category"]
-    html_content = scraping.get_data(
-        url=f"{scraping.SCRAPER_TARGETS['processamento'][category]}&ano={year}"
-    )
+        if dataset in TRADE_DATASETS:
+            results = scraping.parse_import_export_table(
+                year=year, html_content=page.content, metadata={"category": category}
+            )
+        else:
+            results = scraping.parse_html_table(year=year, html_content=page.content)
+        if not results:
+            logger.warning(
+                "%s %s %s parsed to an empty table", dataset, category or "", year
+            )
+            return (Table.from_rows(stored.data, year, kind) if stored else None), False
+        revised = changes.diff_rows(stored.data, results) if stored else []
+        if stored and changes.replaces_table(revised, stored.data):
+            held, seen = held_tables.get(key, (None, 0))
+            seen = seen + 1 if held == results else 1
+            if seen < TABLE_REPLACE_AFTER:
+                held_tables[key] = (results, seen)
+                logger.warning(
+                    "%s %s %s shares no row with its snapshot (%d of %d scrapes)",
+                    dataset,
+                    category or "",
+                    year,
+                    seen,
+                    TABLE_REPLACE_AFTER,
+                )
+                metrics.UNRELATED_TABLES.labels(dataset, "held").inc()
+                return Table.from_rows(stored.data, year, kind), True
+            logger.warning(
+                "Replacing %s %s %s after %d consistent scrapes",
+                dataset,
+                category or "",
+                year,
+                seen,
+            )
+            metrics.UNRELATED_TABLES.labels(dataset, "replaced").inc()
+        held_tables.pop(key, None)
 
-    if html_content:
-        return scraping.parse_html_table(year=year, html_content=html_content)
-    else:
-        return general_csv(
-            path=f"{os.getcwd()}/files/processamento-{category}.csv",
-            year=year,
-            key="cultivar",
-            delimiter=(";" if category == "viniferas" else "\t")
+        if snapshots:
+            if revised:
+                logger.info(
+                    "%d rows of %s %s %s changed upstream",
+                    len(revised),
+                    dataset,
+                    category or "",
+                    year,
+                )
+            await asyncio.to_thread(
+                snapshots.put,
+                snapshot.Snapshot(
+                    url=target_url,
+                    year=year,
+                    dataset=dataset,
+                    category=category,
+                    fetched_at=now,
+                    etag=page.etag,
+                    last_modified=page.last_modified,
+                    content_hash=content_hash,
+                    data=results,
+                ),
+                revised,
+            )
+        return Table.from_rows(results, year, kind), True
+
+    async def fetch_and_parse():
+        stored = (
+            await asyncio.to_thread(snapshots.get, target_url, year)
+            if snapshots
+            else None
         )
+        if not breaker.allow():
+            return Table.from_rows(stored.data, year, kind) if stored else None
 
+        try:
+            table, ok = await revalidate(stored)
+        except BaseException:
+            # Any error, or a cancellation, still resolves a half-open probe.
+            breaker.record_failure()
+            raise
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        return table
 
-def import_data(year: int = 2023, metadata: dict = {}):
-    category = metadata["category"]
-    html_content = scraping.get_data(
-        url=f"{scraping.SCRAPER_TARGETS['importacao'][category]}&ano={year}"
-    )
+    async def load():
+        return await upstream_flight.do(key, fetch_and_parse)
 
-    if html_content:
-        return scraping.parse_import_export_table(
-            year=year, html_content=html_content, metadata=metadata
-        )
-    else:
-        return import_export_csv(
-            path=f"{os.getcwd()}/files/importacao-{category}.csv",
-            year=year,
-            delimiter=(";" if category == "suco-de-uva" else "\t"),
-        )
+    return key, load, cache.ttl_for(dataset, year)
 
 
-def export_data(year: int = 2023, metadata: dict = {}):
-    category = metadata["category"]
-    html_content = scraping.get_data(
-        url=f"{scraping.SCRAPER_TARGETS['exportacao'][category]}&ano={year}"
-    )
-    html_content = None
+def load_snapshots():
+    """Fill the result cache from the snapshot store.
 
-    if html_content:
-        return scraping.parse_import_export_table(
-            year=year, html_content=html_content, metadata=metadata
+    Entries keep the freshness they had when fetched, so anything past its
+    TTL is served at once and revalidated in the background.
+    """
+    if not snapshots:
+        return 0
+    now = time.time()
+    stored = snapshots.all()
+    for entry in stored:
+        ttl = cache.ttl_for(entry.dataset, entry.year)
+        cache.result_cache.set(
+            (entry.dataset, entry.category, entry.year),
+            Table.from_rows(entry.data, entry.year, kind_for(entry.dataset)),
+            ttl=max(0.0, ttl - (now - entry.fetched_at)),
         )
+    logger.info("Loaded %d snapshots", len(stored))
+    return len(stored)
+
+
+def data_version(key: tuple) -> tuple:
+    """Return what a response built for key depends on, to tell when it changes.
+
+    That is the result-cache entry for key, the CSV store generation and,
+    on workers reading the shared cache, the generation of the mapped file.
+    """
+    published = None
+    if shared_cache and not shared_cache.is_writer:
+        published = shared_cache.version()
+    return cache.result_cache.peek(key), store.version(), published
+
+
+def shared_entries() -> list:
+    """Return (key, table, fresh_until) for every fresh entry of the result cache."""
+    now, wall = time.monotonic(), time.time()
+    return [
+        (key, entry.value, wall + entry.fresh_until - now)
+        for key, entry in cache.result_cache.items()
+        if entry.fresh_until > now
+    ]
+
+
+async def share_cache(on_acquire=None):
+    """Publish the result cache for the other workers while this one is the writer.
+
+    Workers that are not the writer keep trying to take over, so a new
+    writer is elected if the current one exits. A worker that becomes the
+    writer first copies the tables still fresh in the shared file into its
+    result cache, then calls ``on_acquire``.
+    """
+    published, writer = None, False
+    while True:
+        if shared_cache.acquire():
+            if not writer:
+                writer = True
+                now = time.time()
+                for key, table, fresh_until in shared_cache.entries():
+                    cache.result_cache.set(key, table, ttl=fresh_until - now)
+                if on_acquire is not None:
+                    on_acquire()
+            if cache.result_cache.version != published:
+                published = cache.result_cache.version
+                try:
+                    await asyncio.to_thread(shared_cache.publish, shared_entries())
+                except OSError:
+                    logger.exception("Failed to publish the shared cache")
+        await asyncio.sleep(shared_cache.interval)
+
+
+async def scrape_table(dataset: str, year: int, category: str | None = None):
+    """Return the upstream ``Table`` for a dataset, category and year.
+
+    Workers that are not the shared cache writer serve the tables mapped
+    from ``shared_cache`` as they are, without copying them into their own
+    cache. Other results are served from ``cache.result_cache``. Returns
+    None when the table is not cached and it cannot be fetched.
+    """
+    key, load, ttl = table_loader(dataset, year, category)
+    if shared_cache and not shared_cache.is_writer:
+        published = shared_cache.get(key)
+        if published is not None:
+            return published
+    return await cache.result_cache.get_or_load(key, load, ttl=ttl)
+
+
+async def refresh_table(dataset: str, year: int, category: str | None = None):
+    """Fetch a table again and store it, even if the cached copy is fresh."""
+    key, load, ttl = table_loader(dataset, year, category)
+    return await cache.result_cache.refresh(key, load, ttl=ttl)
+
+
+async def scrape_or_lookup(dataset: str, year: int, category: str | None = None):
+    """Return the upstream table, or the CSV table when it cannot be scraped.
+
+    Marks the request as ``cache.degraded`` when falling back to the CSV
+    table or when the table is empty.
+    """
+    results = await scrape_table(dataset, year, category)
+
+    if results is not None:
+        metrics.DATA_SOURCE.labels(dataset, "upstream").inc()
     else:
-        return import_export_csv(
-            path=f"{os.getcwd()}/files/exportacao-{category}.csv",
-            year=year,
-            delimiter="\t",
-        )
+        metrics.DATA_SOURCE.labels(dataset, "csv").inc()
+        results = store.lookup(dataset, year, category)
+        cache.degraded.set(True)
+    if not results:
+        cache.degraded.set(True)
+    return results
+
+
+async def production_data(year: int = 2023):
+    return await scrape_or_lookup("producao", year)
+
+
+async def commercialization_data(year: int = 2023):
+    return await scrape_or_lookup("comercializacao", year)
+
+
+async def processing_data(year: int = 2023, metadata: dict = {}):
+    return await scrape_or_lookup("processamento", year, metadata["category"])
+
+
+async def import_data(year: int = 2023, metadata: dict = {}):
+    return await scrape_or_lookup("importacao", year, metadata["category"])
+
+
+async def export_data(year: int = 2023, metadata: dict = {}):
+    return await scrape_or_lookup("exportacao", year, metadata["category"])
+
+
+def series_data(
+    dataset: str, start_year: int, end_year: int, category: str | None = None
+):
+    """Return the rows of every year in a range from the CSV year matrix."""
+    return store.series(dataset, start_year, end_year, category)
+
+
+def series_matrix(dataset: str, category: str | None = None):
+    """Return the CSV year matrix of a dataset, or None if it is not loaded."""
+    return store.matrix(dataset, category)
@@ -0,0 +1,248 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from app.table import Table, intern_names, kind_for
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EMBRSHM2"
+# magic, generation, published_at, index length
+HEADER = struct.Struct("<8sQdI")
+ARRAY_FIELDS = ("quantity", "amount", "sub_offsets", "sub_quantity")
+ITEMSIZE = np.dtype(np.int64).itemsize
+
+
+def align(offset: int) -> int:
+    return -(-offset // ITEMSIZE) * ITEMSIZE
+
+
+class MappedSnapshot:
+    """One published version of the shared cache file, mapped read-only.
+
+    The file is a fixed header, a JSON index of ``[dataset, category, year,
+    fresh_until, table]`` entries and the int64 columns of every table back
+    to back. ``table`` holds the kind, year, category and names of a
+    ``Table`` and the ``[offset, count]`` of each of its columns. When the
+    file is mapped, every table is built over ``np.frombuffer`` views of
+    the map, so the numbers are shared by every worker mapping the file
+    instead of copied into each of them.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, self.published_at, index_length = HEADER.unpack_from(
+            self._map
+        )
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a shared cache file")
+        start = align(HEADER.size + index_length)
+        self._tables = {
+            (dataset, category, year): (self._table(start, table), fresh_until)
+            for dataset, category, year, fresh_until, table in json.loads(
+                self._map[HEADER.size : HEADER.size + index_length]
+            )
+        }
+
+    def _table(self, start: int, table: dict) -> Table:
+        arrays = {
+            name: np.frombuffer(
+                self._map, dtype=np.int64, count=count, offset=start + offset
+            )
+            for name, (offset, count) in table["arrays"].items()
+        }
+        sub_names = table.get("sub_names")
+        return Table(
+            kind=table["kind"],
+            year=table["year"],
+            names=intern_names(table["names"]),
+            sub_names=None if sub_names is None else intern_names(sub_names),
+            category=table.get("category"),
+            **arrays,
+        )
+
+    def __len__(self):
+        return len(self._tables)
+
+    def get(self, key: tuple, now: float | None = None) -> Table | None:
+        """Return the table for key while it is fresh, else None."""
+        table, fresh_until = self._tables.get(key, (None, 0.0))
+        if (time.time() if now is None else now) >= fresh_until:
+            return None
+        return table
+
+    def entries(self, now: float | None = None) -> list:
+        """Return (key, table, fresh_until) for every fresh table."""
+        now = time.time() if now is None else now
+        return [
+            (key, table, fresh_until)
+            for key, (table, fresh_until) in self._tables.items()
+            if fresh_until > now
+        ]
+
+    def close(self):
+        self._tables = {}
+        try:
+            self._map.close()
+        except BufferError:
+            # Tables still in use keep the map open until they are collected.
+            pass
+
+
+def write_snapshot(path: str, generation: int, entries) -> int:
+    """Write entries of (key, table, fresh_until) as a new version of path.
+
+    Tables may also be given as lists of rows. The file is written next to
+    path and renamed over it, so readers see either the previous version or
+    the complete new one.
+    """
+    index, payloads, offset = [], [], 0
+    for (dataset, category, year), table, fresh_until in entries:
+        if not isinstance(table, Table):
+            table = Table.from_rows(table, year, kind_for(dataset))
+        arrays = {}
+        for name in ARRAY_FIELDS:
+            array = getattr(table, name)
+            if array is None:
+                continue
+            payload = np.ascontiguousarray(array, dtype=np.int64).tobytes()
+            arrays[name] = [offset, len(array)]
+            payloads.append(payload)
+            offset += len(payload)
+        meta = {
+            "kind": table.kind,
+            "year": table.year,
+            "category": table.category,
+            "names": table.names,
+            "sub_names": table.sub_names,
+            "arrays": arrays,
+        }
+        index.append([dataset, category, year, fresh_until, meta])
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode()
+    header_length = HEADER.size + len(index_bytes)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, generation, time.time(), len(index_bytes)))
+        file.write(index_bytes)
+        file.write(b"\0" * (align(header_length) - header_length))
+        for payload in payloads:
+            file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    return len(index)
+
+
+class SharedCache:
+    """Parsed tables shared by every worker through one memory-mapped file.
+
+    The worker that holds an exclusive ``flock`` on ``path.lock`` is the
+    writer: it scrapes and publishes its result cache with ``publish``.
+    The others map the latest version and read tables from it instead of
+    fetching them, checking for a newer version at most once every
+    ``interval`` seconds. A worker mapping an existing file at startup can
+    serve every published table at once.
+    """
+
+    def __init__(self, path: str, interval: float = 30):
+        self.path = path
+        self.interval = interval
+        self.generation = 0
+        self._snapshot: MappedSnapshot | None = None
+        self._identity = None
+        self._checked_at = 0.0
+        self._lock_file = None
+
+    @property
+    def is_writer(self) -> bool:
+        return self._lock_file is not None
+
+    def acquire(self) -> bool:
+        """Try to become the writer; return True if this worker is it."""
+        if self._lock_file is not None:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(f"{self.path}.lock", "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info("Worker %d is the shared cache writer", os.getpid())
+        return True
+
+    def reload(self):
+        """Map the current file if it changed since it was last mapped."""
+        self._checked_at = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self._identity:
+            return
+        try:
+            snapshot = MappedSnapshot(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.error("Failed to map %s: %s", self.path, e)
+            return
+        previous, self._snapshot, self._identity = self._snapshot, snapshot, identity
+        self.generation = max(self.generation, snapshot.generation)
+        if previous is not None:
+            previous.close()
+        logger.debug("Mapped shared cache generation %d", snapshot.generation)
+
+    def _check_reload(self):
+        if time.monotonic() - self._checked_at >= self.interval:
+            self.reload()
+
+    def get(self, key: tuple) -> Table | None:
+        """Return the published table for key while fresh, else None."""
+        self._check_reload()
+        return self._snapshot.get(key) if self._snapshot else None
+
+    def version(self) -> int:
+        """Return the generation of the mapped file, mapping a newer one first."""
+        self._check_reload()
+        return self.generation
+
+    def entries(self) -> list:
+        """Return (key, table, fresh_until) for every fresh published table."""
+        return self._snapshot.entries() if self._snapshot else []
+
+    def publish(self, entries) -> int:
+        """Write a new version from (key, table, fresh_until) entries."""
+        if self._snapshot is None:
+            self.reload()
+        self.generation += 1
+        count = write_snapshot(self.path, self.generation, entries)
+        logger.info("Published %d tables as generation %d", count, self.generation)
+        return count
+
+    def close(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def create_cache() -> SharedCache | None:
+    """Return the configured cache, or None when SHARED_CACHE_PATH is empty."""
+    path = os.getenv("SHARED_CACHE_PATH", "")
+    if not path:
+        return None
+    return SharedCache(path, interval=float(os.getenv("SHARED_CACHE_INTERVAL", "30")))
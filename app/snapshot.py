@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+from app.changes import RowChange
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Snapshot:
+    url: str
+    year: int
+    dataset: str
+    category: str | None
+    fetched_at: float
+    etag: str | None
+    last_modified: str | None
+    content_hash: str
+    data: list
+
+
+class SnapshotStore:
+    """SQLite store of parsed upstream tables keyed by target URL and year.
+
+    Each row keeps the parsed rows together with when they were fetched and
+    the validators needed to revalidate them: the upstream ETag and
+    Last-Modified headers and a hash of the page body.
+
+    The ``changes`` table logs the rows that differ between successive
+    versions of a table. Its autoincrement ``version`` orders every change
+    across tables, so clients can ask for the changes after a version.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    url TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    dataset TEXT NOT NULL,
+                    category TEXT,
+                    fetched_at REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (url, year)
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS changes (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dataset TEXT NOT NULL,
+                    category TEXT,
+                    year INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    change TEXT NOT NULL,
+                    data TEXT,
+                    previous TEXT,
+                    detected_at REAL NOT NULL
+                )
+                """
+            )
+        return self._connection
+
+    def get(self, url: str, year: int) -> Snapshot | None:
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT url, year, dataset, category, fetched_at, etag,"
+                    " last_modified, content_hash, data"
+                    " FROM snapshots WHERE url = ? AND year = ?",
+                    (url, year),
+                )
+                .fetchone()
+            )
+        return self._to_snapshot(row) if row else None
+
+    def put(self, snapshot: Snapshot, changes: list[RowChange] = ()):
+        """Store a snapshot, logging its changed rows in the same transaction."""
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    snapshot.url,
+                    snapshot.year,
+                    snapshot.dataset,
+                    snapshot.category,
+                    snapshot.fetched_at,
+                    snapshot.etag,
+                    snapshot.last_modified,
+                    snapshot.content_hash,
+                    json.dumps(snapshot.data, ensure_ascii=False),
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO changes (dataset, category, year, name, change, data,"
+                " previous, detected_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        snapshot.dataset,
+                        snapshot.category,
+                        snapshot.year,
+                        change.name,
+                        change.change,
+                        dump(change.row),
+                        dump(change.previous),
+                        snapshot.fetched_at,
+                    )
+                    for change in changes
+                ],
+            )
+
+    def touch(self, url: str, year: int, fetched_at: float):
+        """Record that a snapshot was revalidated without changes."""
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "UPDATE snapshots SET fetched_at = ? WHERE url = ? AND year = ?",
+                (fetched_at, url, year),
+            )
+
+    def all(self):
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT url, year, dataset, category, fetched_at, etag,"
+                    " last_modified, content_hash, data FROM snapshots"
+                )
+                .fetchall()
+            )
+        return [self._to_snapshot(row) for row in rows]
+
+    def changes(
+        self, since: int = 0, limit: int = 1000, dataset: str | None = None
+    ) -> tuple[list[dict], int, bool]:
+        """Return up to limit changes after version ``since``, oldest first.
+
+        Also returns the version to ask from next time and whether more
+        changes are waiting. With no more changes that version is the
+        latest one, so clients filtering by dataset skip the others.
+        """
+        query = (
+            "SELECT version, dataset, category, year, name, change, data,"
+            " previous, detected_at FROM changes WHERE version > ? AND version <= ?"
+        )
+        with self._lock:
+            connection = self._connect()
+            latest = connection.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM changes"
+            ).fetchone()[0]
+            parameters = [since, latest]
+            if dataset:
+                query += " AND dataset = ?"
+                parameters.append(dataset)
+            rows = connection.execute(
+                query + " ORDER BY version LIMIT ?", (*parameters, limit + 1)
+            ).fetchall()
+
+        more = len(rows) > limit
+        changes = [
+            {
+                "version": version,
+                "dataset": dataset,
+                "category": category,
+                "year": year,
+                "name": name,
+                "change": change,
+                "row": json.loads(data) if data else None,
+                "previous": json.loads(previous) if previous else None,
+                "detected_at": detected_at,
+            }
+            for (
+                version,
+                dataset,
+                category,
+                year,
+                name,
+                change,
+                data,
+                previous,
+                detected_at,
+            ) in rows[:limit]
+        ]
+        if more:
+            return changes, changes[-1]["version"], True
+        return changes, latest, False
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @staticmethod
+    def _to_snapshot(row) -> Snapshot:
+        *fields, data = row
+        return Snapshot(*fields, data=json.loads(data))
+
+
+def dump(row: dict | None) -> str | None:
+    return None if row is None else json.dumps(row, ensure_ascii=False)
+
+
+def create_store() -> SnapshotStore | None:
+    """Return the configured store, or None when SNAPSHOT_PATH is empty."""
+    path = os.getenv("SNAPSHOT_PATH", f"{os.getcwd()}/data/snapshots.sqlite3")
+    return SnapshotStore(path) if path else None
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.matrix import SeriesMatrix
+
+OPERATIONS = ("top", "sum", "growth", "share")
+
+
+@dataclass
+class SeriesStats:
+    """Per-year aggregates of a ``SeriesMatrix``, built once when it is loaded.
+
+    Only top-level rows are aggregated, since sub-items are part of their
+    parent item. For every metric ``totals`` holds the yearly total,
+    ``order`` the rows of each year sorted largest first and ``cumulative``
+    the running sum of each row along the years, so the total of a row over
+    any range of years is one subtraction.
+    """
+
+    years: np.ndarray
+    names: list[str]
+    values: dict[str, np.ndarray]
+    totals: dict[str, np.ndarray]
+    order: dict[str, np.ndarray]
+    cumulative: dict[str, np.ndarray]
+
+    @classmethod
+    def from_matrix(cls, matrix: SeriesMatrix):
+        rows = np.flatnonzero(matrix.parents == -1)
+        values = {metric: array[rows] for metric, array in matrix.values.items()}
+        return cls(
+            years=matrix.years,
+            names=[matrix.names[row] for row in rows],
+            values=values,
+            totals={metric: array.sum(axis=0) for metric, array in values.items()},
+            order={
+                metric: np.argsort(-array, axis=0, kind="stable").T
+                for metric, array in values.items()
+            },
+            cumulative={
+                metric: np.concatenate(
+                    [np.zeros((len(rows), 1), dtype=np.int64), array.cumsum(axis=1)],
+                    axis=1,
+                )
+                for metric, array in values.items()
+            },
+        )
+
+    def columns(self, start_year: int, end_year: int) -> tuple[int, int]:
+        lo = int(np.searchsorted(self.years, start_year, side="left"))
+        hi = int(np.searchsorted(self.years, end_year, side="right"))
+        return lo, hi
+
+    def row(self, name: str) -> int:
+        """Return the row of a top-level item or country, KeyError if unknown."""
+        for row, candidate in enumerate(self.names):
+            if candidate.casefold() == name.casefold():
+                return row
+        raise KeyError(name)
+
+    def sum(self, start_year: int, end_year: int) -> list[dict]:
+        """Return the total of every metric per year."""
+        lo, hi = self.columns(start_year, end_year)
+        return [
+            {
+                "year": int(self.years[column]),
+                **{
+                    metric: int(totals[column])
+                    for metric, totals in self.totals.items()
+                },
+            }
+            for column in range(lo, hi)
+        ]
+
+    def top(
+        self, metric: str, start_year: int, end_year: int, limit: int = 10
+    ) -> list[dict]:
+        """Return the ``limit`` largest rows over the range with their share."""
+        lo, hi = self.columns(start_year, end_year)
+        if hi <= lo:
+            return []
+        if hi - lo == 1:
+            rows = self.order[metric][lo][:limit]
+            values = self.values[metric][:, lo]
+            total = int(self.totals[metric][lo])
+        else:
+            values = self.cumulative[metric][:, hi] - self.cumulative[metric][:, lo]
+            rows = np.argsort(-values, kind="stable")[:limit]
+            total = int(self.totals[metric][lo:hi].sum())
+        return [
+            {
+                "rank": rank,
+                "name": self.names[row],
+                metric: int(values[row]),
+                "share": round(int(values[row]) / total, 6) if total else 0.0,
+            }
+            for rank, row in enumerate(rows.tolist(), start=1)
+        ]
+
+    def share(
+        self, metric: str, start_year: int, end_year: int, limit: int = 10
+    ) -> list[dict]:
+        """Return the ``limit`` largest shares, with the rest summed as "Others"."""
+        results = self.top(metric, start_year, end_year, limit)
+        lo, hi = self.columns(start_year, end_year)
+        total = int(self.totals[metric][lo:hi].sum())
+        rest = total - sum(result[metric] for result in results)
+        if rest > 0:
+            results.append(
+                {
+                    "rank": None,
+                    "name": "Others",
+                    metric: rest,
+                    "share": round(rest / total, 6),
+                }
+            )
+        return results
+
+    def growth(
+        self, metric: str, start_year: int, end_year: int, name: str | None = None
+    ) -> list[dict]:
+        """Return the year-over-year growth of the total, or of one row."""
+        series = (
+            self.totals[metric] if name is None else self.values[metric][self.row(name)]
+        )
+        lo, hi = self.columns(start_year, end_year)
+        results = []
+        for column in range(lo, hi):
+            value = int(series[column])
+            previous = int(series[column - 1]) if column > 0 else None
+            results.append(
+                {
+                    "year": int(self.years[column]),
+                    metric: value,
+                    "change": None if previous is None else value - previous,
+                    "growth": (
+                        round((value - previous) / previous, 6) if previous else None
+                    ),
+                }
+            )
+        return results
@@ -0,0 +1,177 @@
+import sys
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+TRADE_DATASETS = ("importacao", "exportacao")
+
+
+def kind_for(dataset: str) -> str:
+    """Return the table kind of a dataset's rows."""
+    return "trade" if dataset in TRADE_DATASETS else "general"
+
+
+def intern_names(names) -> list[str]:
+    """Return names as a list of interned strings."""
+    return [sys.intern(name) for name in names]
+
+
+@dataclass(eq=False)
+class Table(Sequence):
+    """One year of a dataset stored as columns instead of a list of row dicts.
+
+    ``names`` holds the item or country of every row, interned so the same
+    name is one string across every cached table, and ``quantity`` and
+    ``amount`` (trade tables only) are int64 arrays. General tables store
+    their sub-items flattened in ``sub_names`` and ``sub_quantity``; the
+    sub-items of row i are ``sub_offsets[i]:sub_offsets[i + 1]``. ``category``
+    is added to every row when set, as the scraper's metadata is.
+
+    A table reads as a sequence of the public row dicts, built on access.
+    ``to_rows`` converts the whole table at the response edge.
+    """
+
+    kind: str
+    year: int
+    names: list[str]
+    quantity: np.ndarray
+    amount: np.ndarray | None = None
+    sub_offsets: np.ndarray | None = None
+    sub_names: list[str] | None = None
+    sub_quantity: np.ndarray | None = None
+    category: str | None = None
+
+    @classmethod
+    def from_rows(cls, rows: list, year: int, kind: str | None = None):
+        """Build a table from rows as the parsers return them.
+
+        ``kind`` is taken from the first row when not given, so pass it for
+        rows that may be empty.
+        """
+        category = rows[0].get("category") if rows else None
+        if kind is None:
+            kind = "trade" if rows and "country" in rows[0] else "general"
+        if kind == "trade":
+            return cls(
+                kind="trade",
+                year=rows[0]["year"] if rows else year,
+                names=intern_names(row["country"] for row in rows),
+                quantity=np.array([row["quantity"] for row in rows], dtype=np.int64),
+                amount=np.array([row["amount"] for row in rows], dtype=np.int64),
+                category=category,
+            )
+
+        offsets, sub_names, sub_quantity = [0], [], []
+        for row in rows:
+            for sub_item in row["sub_items"]:
+                sub_names.append(sub_item["name"])
+                sub_quantity.append(sub_item["quantity"])
+            offsets.append(len(sub_names))
+        return cls(
+            kind="general",
+            year=rows[0]["year"] if rows else year,
+            names=intern_names(row["item"] for row in rows),
+            quantity=np.array([row["quantity"] for row in rows], dtype=np.int64),
+            sub_offsets=np.array(offsets, dtype=np.int64),
+            sub_names=intern_names(sub_names),
+            sub_quantity=np.array(sub_quantity, dtype=np.int64),
+            category=category,
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(position) for position in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("table index out of range")
+        return self.row(index)
+
+    def __iter__(self):
+        return iter(self.to_rows())
+
+    def __eq__(self, other):
+        if isinstance(other, Table):
+            return self.to_rows() == other.to_rows()
+        if isinstance(other, list):
+            return self.to_rows() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def row(self, position: int) -> dict:
+        """Return the public dict of one row."""
+        if self.kind == "trade":
+            row = {
+                "country": self.names[position],
+                "quantity": int(self.quantity[position]),
+                "amount": int(self.amount[position]),
+                "year": self.year,
+            }
+        else:
+            start, end = self.sub_offsets[position : position + 2].tolist()
+            row = {
+                "item": self.names[position],
+                "quantity": int(self.quantity[position]),
+                "year": self.year,
+                "sub_items": [
+                    {"name": name, "quantity": quantity}
+                    for name, quantity in zip(
+                        self.sub_names[start:end],
+                        self.sub_quantity[start:end].tolist(),
+                    )
+                ],
+            }
+        if self.category is not None:
+            row["category"] = self.category
+        return row
+
+    def to_rows(self) -> list:
+        """Return every row in the public JSON shape."""
+        year, quantities = self.year, self.quantity.tolist()
+        if self.kind == "trade":
+            rows = [
+                {"country": name, "quantity": quantity, "amount": amount, "year": year}
+                for name, quantity, amount in zip(
+                    self.names, quantities, self.amount.tolist()
+                )
+            ]
+        else:
+            offsets = self.sub_offsets.tolist()
+            sub_items = [
+                {"name": name, "quantity": quantity}
+                for name, quantity in zip(self.sub_names, self.sub_quantity.tolist())
+            ]
+            rows = [
+                {
+                    "item": name,
+                    "quantity": quantity,
+                    "year": year,
+                    "sub_items": sub_items[offsets[position] : offsets[position + 1]],
+                }
+                for position, (name, quantity) in enumerate(zip(self.names, quantities))
+            ]
+        if self.category is not None:
+            for row in rows:
+                row["category"] = self.category
+        return rows
+
+    def columns(self) -> dict[str, list]:
+        """Return the trade fields as lists, one value per row."""
+        return {
+            "country": self.names,
+            "quantity": self.quantity.tolist(),
+            "amount": [] if self.amount is None else self.amount.tolist(),
+            "year": [self.year] * len(self),
+        }
+
+
+def jsonable(value):
+    """``default`` hook for json.dumps that encodes tables as their rows."""
+    if isinstance(value, Table):
+        return value.to_rows()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import time
+
+from app import cache, scraping, services
+from app.models import FIRST_YEAR, LAST_TRADE_YEAR, LAST_YEAR
+
+logger = logging.getLogger(__name__)
+
+
+def iter_targets():
+    """Yield (dataset, category, year) for every scraped page, newest years first."""
+    for dataset, target in scraping.SCRAPER_TARGETS.items():
+        last_year = LAST_TRADE_YEAR if dataset in services.TRADE_DATASETS else LAST_YEAR
+        categories = target if isinstance(target, dict) else [None]
+        for category in categories:
+            for year in range(last_year, FIRST_YEAR - 1, -1):
+                yield dataset, category, year
+
+
+class Warmer:
+    """Background crawler that keeps ``cache.result_cache`` populated.
+
+    The first pass loads every SCRAPER_TARGETS page x year that is not cached
+    yet. After that, open years are refreshed every ``current_interval``
+    seconds and every page every ``interval`` seconds. At most
+    ``concurrency`` fetches run at once and new fetches start no faster than
+    ``rate`` per second.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        rate: float = 2.0,
+        interval: float = 86400,
+        current_interval: float = 900,
+    ):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.interval = interval
+        self.current_interval = current_interval
+        self.passes = 0
+        self.loaded = 0
+        self.failed = 0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _throttle(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + 1 / self.rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def crawl(self, targets, refresh: bool = False):
+        """Load every (dataset, category, year) in targets."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        load = services.refresh_table if refresh else services.scrape_table
+
+        async def warm(dataset, category, year):
+            async with semaphore:
+                await self._throttle()
+                try:
+                    result = await load(dataset, year, category)
+                except Exception:
+                    logger.exception("Warming %s %s %s failed", dataset, category, year)
+                    result = None
+            if result is None:
+                self.failed += 1
+            else:
+                self.loaded += 1
+
+        await asyncio.gather(*(warm(*target) for target in targets))
+        self.passes += 1
+
+    async def run(self):
+        targets = list(iter_targets())
+        logger.info("Warming %d upstream pages", len(targets))
+        await self.crawl(targets)
+        last_full = time.monotonic()
+
+        while True:
+            await asyncio.sleep(self.current_interval)
+            if time.monotonic() - last_full >= self.interval:
+                await self.crawl(targets, refresh=True)
+                last_full = time.monotonic()
+            else:
+                open_targets = [
+                    target for target in targets if not cache.is_closed_year(target[2])
+                ]
+                await self.crawl(open_targets, refresh=True)
+
+    def stats(self) -> dict:
+        return {"passes": self.passes, "loaded": self.loaded, "failed": self.failed}
+
+
+def enabled() -> bool:
+    return os.getenv("WARMER_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+warmer = Warmer(
+    concurrency=int(os.getenv("WARMER_CONCURRENCY", "4")),
+    rate=float(os.getenv("WARMER_RATE", "2")),
+    interval=float(os.getenv("WARMER_INTERVAL", "86400")),
+    current_interval=float(os.getenv("WARMER_CURRENT_INTERVAL", "900")),
+)
@@ -0,0 +1,198 @@
+"""Drive the API under concurrent load against the stub vitibrasil server.
+
+    python -m benchmarks.load [--requests 2000] [--concurrency 32]
+        [--latency 0.2] [--jitter 0.1] [--error-rate 0.05] [--output FILE]
+
+Starts ``benchmarks.stub_server`` and the app (``benchmarks.serve_app``)
+as subprocesses, then sends the same seeded mix of requests twice: "cold"
+right after startup and "warm" once the caches are filled. Pass --app-url
+to load an API that is already running instead.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+from app.models import LAST_TRADE_YEAR, LAST_YEAR
+from benchmarks import common
+
+API_KEY = "benchmark-key"
+
+CATEGORIES = {
+    "processing": ["viniferas", "americanas-e-hibridas", "uva-de-mesa"],
+    "import": ["vinhos-de-mesa", "espumantes", "uvas-frescas", "suco-de-uva"],
+    "export": ["vinhos-de-mesa", "espumantes", "uvas-frescas", "suco-de-uva"],
+}
+
+
+def request_mix(count: int, seed: int, years: int = 10) -> list[tuple[str, str]]:
+    """Return (route, path) pairs over the most recent ``years`` years."""
+    rng = random.Random(seed)
+    mix = []
+    for _ in range(count):
+        kind = rng.choices(
+            ["production", "commercialization", "processing", "trade", "series"],
+            weights=[2, 2, 2, 4, 1],
+        )[0]
+        if kind in ("production", "commercialization"):
+            year = rng.randint(LAST_YEAR - years + 1, LAST_YEAR)
+            mix.append((f"/v1/{kind}", f"/v1/{kind}?year={year}"))
+        elif kind == "processing":
+            year = rng.randint(LAST_YEAR - years + 1, LAST_YEAR)
+            category = rng.choice(CATEGORIES["processing"])
+            mix.append(
+                ("/v1/processing/{category}", f"/v1/processing/{category}?year={year}")
+            )
+        elif kind == "trade":
+            dataset = rng.choice(["import", "export"])
+            year = rng.randint(LAST_TRADE_YEAR - years + 1, LAST_TRADE_YEAR)
+            category = rng.choice(CATEGORIES[dataset])
+            mix.append(
+                (f"/v1/{dataset}/{{category}}", f"/v1/{dataset}/{category}?year={year}")
+            )
+        else:
+            start = rng.randint(1970, 2000)
+            mix.append(
+                (
+                    "/v1/production (series)",
+                    f"/v1/production?start_year={start}&end_year={start + 20}",
+                )
+            )
+    return mix
+
+
+async def run_phase(base_url: str, mix: list, concurrency: int) -> dict:
+    queue = list(reversed(mix))
+    latencies = defaultdict(list)
+    statuses = Counter()
+    headers = {"X-API-Key": API_KEY, "Accept-Encoding": "gzip"}
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, limits=limits, timeout=60
+    ) as client:
+
+        async def worker():
+            while queue:
+                route, path = queue.pop()
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies[route].append(time.perf_counter() - start)
+                statuses[status] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    every = [sample for samples in latencies.values() for sample in samples]
+    return {
+        "requests": len(every),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(every) / elapsed, 2),
+        "statuses": dict(statuses),
+        "latency": common.summarize(every),
+        "routes": {
+            route: common.summarize(samples)
+            for route, samples in sorted(latencies.items())
+        },
+    }
+
+
+def wait_until_ready(url: str, process: subprocess.Popen | None, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start in {timeout}s")
+
+
+def start_servers(args) -> list[subprocess.Popen]:
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.stub_server",
+            f"--port={args.stub_port}",
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+            f"--error-rate={args.error_rate}",
+            f"--seed={args.seed}",
+        ]
+    )
+    wait_until_ready(stub_url, stub)
+
+    env = {
+        **os.environ,
+        "API_KEYS": f"user1:{hashlib.sha256(API_KEY.encode()).hexdigest()}",
+        "SNAPSHOT_PATH": "",
+        "WARMER_ENABLED": "false",
+    }
+    app = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.serve_app",
+            f"--upstream={stub_url}",
+            f"--port={args.app_port}",
+        ],
+        env=env,
+    )
+    wait_until_ready(f"http://127.0.0.1:{args.app_port}/health", app)
+    return [app, stub]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--app-port", type=int, default=8800)
+    parser.add_argument("--app-url", help="Load a running API instead")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    processes = [] if args.app_url else start_servers(args)
+    base_url = args.app_url or f"http://127.0.0.1:{args.app_port}"
+    mix = request_mix(args.requests, args.seed)
+    try:
+        results = [
+            {"phase": phase, **asyncio.run(run_phase(base_url, mix, args.concurrency))}
+            for phase in ("cold", "warm")
+        ]
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    parameters = {
+        name: getattr(args, name)
+        for name in ("requests", "concurrency", "latency", "jitter", "error_rate")
+    }
+    parameters["seed"] = args.seed
+    common.write_results("load", parameters, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Compare the memory held by row dicts and by columnar tables.
+
+    python -m benchmarks.memory [--start-year 2000] [--repeat 20] [--output FILE]
+
+"csv" measures every files/*.csv as the CSV store used to hold it (a dict
+of row lists per year plus the year matrix) and as it holds it now (the
+matrix plus a ``Table`` per year). "scraped" parses a vitibrasil-like page
+per year from --start-year, the way the result cache is filled, and keeps
+either the parsed rows or ``Table.from_rows`` of them. Sizes are bytes
+still allocated after building, measured with tracemalloc.
+"""
+
+import argparse
+import gc
+import logging
+import tracemalloc
+
+from app import scraping
+from app.csv_store import CsvStore, iter_sources
+from app.matrix import SeriesMatrix
+from app.models import LAST_YEAR
+from app.parser_csv import general_csv_years, import_export_csv_years
+from app.table import Table
+from benchmarks import common, synthetic
+
+
+def retained(build) -> tuple[object, int]:
+    """Call build and return its result and the bytes it left allocated."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+
+def parse_years(path: str, source: dict) -> dict:
+    if "key" in source:
+        return general_csv_years(path, source["key"], source["delimiter"])
+    return import_export_csv_years(path, source["delimiter"])
+
+
+def to_matrix(years: dict, source: dict) -> SeriesMatrix:
+    if "key" in source:
+        return SeriesMatrix.from_general_years(years)
+    return SeriesMatrix.from_trade_years(years)
+
+
+def csv_results(files_dir: str) -> list:
+    store = CsvStore(files_dir)
+    results = []
+    for dataset, category, source in iter_sources():
+        path = store.path(source)
+
+        def rows_and_matrix():
+            years = parse_years(path, source)
+            return years, to_matrix(years, source)
+
+        def tables():
+            matrix = to_matrix(parse_years(path, source), source)
+            return matrix, [matrix.table(column) for column in range(len(matrix.years))]
+
+        (years, _), before = retained(rows_and_matrix)
+        _, after = retained(tables)
+        results.append(
+            {
+                "benchmark": "csv",
+                "dataset": dataset,
+                "category": category,
+                "years": len(years),
+                "rows": sum(len(rows) for rows in years.values()),
+                "dicts_bytes": before,
+                "tables_bytes": after,
+                "ratio": round(before / after, 2),
+            }
+        )
+    return results
+
+
+def scraped_results(start_year: int, repeat: int) -> list:
+    general, trade = synthetic.sample_rows()
+    cases = [
+        (
+            "producao",
+            synthetic.page(synthetic.general_table(general)),
+            scraping.parse_html_table,
+        ),
+        (
+            "importacao",
+            synthetic.page(synthetic.trade_table(trade)),
+            scraping.parse_import_export_table,
+        ),
+    ]
+    years = range(start_year, LAST_YEAR + 1)
+    results = []
+    for dataset, html, parse in cases:
+        rows, before = retained(
+            lambda: [parse(year=year, html_content=html) for year in years]
+        )
+        tables, after = retained(
+            lambda: [
+                Table.from_rows(parse(year=year, html_content=html), year)
+                for year in years
+            ]
+        )
+        results.append(
+            {
+                "benchmark": "scraped",
+                "dataset": dataset,
+                "years": len(years),
+                "rows": sum(len(year_rows) for year_rows in rows),
+                "dicts_bytes": before,
+                "tables_bytes": after,
+                "ratio": round(before / after, 2),
+                "to_rows": common.measure(tables[-1].to_rows, repeat=repeat),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files-dir", default="files")
+    parser.add_argument("--start-year", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = csv_results(args.files_dir)
+    totals = {
+        name: sum(result[name] for result in results)
+        for name in ("rows", "dicts_bytes", "tables_bytes")
+    }
+    results.append(
+        {
+            "benchmark": "csv",
+            "dataset": "total",
+            **totals,
+            "ratio": round(totals["dicts_bytes"] / totals["tables_bytes"], 2),
+        }
+    )
+    results += scraped_results(args.start_year, args.repeat)
+    common.write_results(
+        "memory",
+        {"start_year": args.start_year, "repeat": args.repeat},
+        results,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Time the HTML and CSV parsers.
+
+    python -m benchmarks.parsers [--repeat 20] [--scales 1,10,100] [--output FILE]
+
+HTML parsers run with every engine on vitibrasil-like pages built from the
+2023 CSV rows, repeated ``scale`` times. CSV parsers run on files/*.csv.
+"""
+
+import argparse
+import logging
+
+from app import parser_csv, scraping
+from app.csv_store import CSV_SOURCES
+from benchmarks import common, synthetic
+
+
+def html_cases(scales: list[int]):
+    general, trade = synthetic.sample_rows()
+    for scale in scales:
+        yield (
+            "parse_html_table",
+            scale,
+            synthetic.page(
+                synthetic.general_table(synthetic.scale_general(general, scale))
+            ),
+            scraping.parse_html_table,
+        )
+        yield (
+            "parse_import_export_table",
+            scale,
+            synthetic.page(synthetic.trade_table(synthetic.scale_trade(trade, scale))),
+            scraping.parse_import_export_table,
+        )
+
+
+def csv_cases():
+    general = CSV_SOURCES["producao"]
+    trade = CSV_SOURCES["importacao"]["vinhos-de-mesa"]
+    general_path = f"files/{general['file']}"
+    trade_path = f"files/{trade['file']}"
+    yield "general_csv", general_path, lambda: parser_csv.general_csv(
+        general_path, 2023, key=general["key"], delimiter=general["delimiter"]
+    )
+    yield "import_export_csv", trade_path, lambda: parser_csv.import_export_csv(
+        trade_path, 2023, delimiter=trade["delimiter"]
+    )
+    yield "general_csv_years", general_path, lambda: parser_csv.general_csv_years(
+        general_path, key=general["key"], delimiter=general["delimiter"]
+    )
+    yield "import_export_csv_years", trade_path, lambda: (
+        parser_csv.import_export_csv_years(trade_path, delimiter=trade["delimiter"])
+    )
+
+
+def run(repeat: int, scales: list[int]) -> list:
+    results = []
+    for parser, scale, html, parse in html_cases(scales):
+        for engine in scraping.PARSER_ENGINES:
+            rows = parse(year=2023, html_content=html, engine=engine)
+            results.append(
+                {
+                    "benchmark": parser,
+                    "engine": engine,
+                    "scale": scale,
+                    "bytes": len(html.encode("utf-8")),
+                    "rows": len(rows),
+                    **common.measure(
+                        lambda: parse(year=2023, html_content=html, engine=engine),
+                        repeat=repeat,
+                    ),
+                }
+            )
+    for parser, path, parse in csv_cases():
+        results.append(
+            {
+                "benchmark": parser,
+                "file": path,
+                **common.measure(parse, repeat=repeat),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--scales", default="1,10,100")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    scales = [int(scale) for scale in args.scales.split(",")]
+    common.write_results(
+        "parsers",
+        {"repeat": args.repeat, "scales": scales},
+        run(args.repeat, scales),
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Run the API with every SCRAPER_TARGETS page pointed at another host.
+
+python -m benchmarks.serve_app --upstream http://127.0.0.1:8765 [--port 8800]
+"""
+
+import argparse
+import logging
+
+import uvicorn
+
+from app import scraping
+
+VITIBRASIL = "http://vitibrasil.cnpuv.embrapa.br"
+
+
+def point_targets_at(base_url: str):
+    for dataset, target in scraping.SCRAPER_TARGETS.items():
+        if isinstance(target, dict):
+            for category, url in target.items():
+                target[category] = url.replace(VITIBRASIL, base_url)
+        else:
+            scraping.SCRAPER_TARGETS[dataset] = target.replace(VITIBRASIL, base_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--upstream", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    args = parser.parse_args()
+
+    point_targets_at(args.upstream.rstrip("/"))
+    from app.main import app
+
+    logging.disable(logging.ERROR)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
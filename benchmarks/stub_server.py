@@ -0,0 +1,122 @@
+"""A local stand-in for vitibrasil that serves pages built from files/*.csv.
+
+    python -m benchmarks.stub_server [--port 8765] [--latency 0.2]
+        [--jitter 0.1] [--error-rate 0.05] [--seed 1]
+
+Every SCRAPER_TARGETS page is answered for any ``ano``, after ``latency``
+plus up to ``jitter`` seconds; ``error_rate`` of the requests get a 500.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+from urllib.parse import parse_qs, urlsplit
+
+import uvicorn
+
+from app import scraping
+from app.csv_store import CsvStore
+from app.services import TRADE_DATASETS
+from benchmarks import synthetic
+
+
+def target_pages() -> dict:
+    """Map the (opcao, subopcao) of every scraped page to its dataset and category."""
+    pages = {}
+    for dataset, target in scraping.SCRAPER_TARGETS.items():
+        urls = target.items() if isinstance(target, dict) else [(None, target)]
+        for category, url in urls:
+            query = parse_qs(urlsplit(url).query)
+            key = (query["opcao"][0], query.get("subopcao", [None])[0])
+            pages[key] = (dataset, category)
+    return pages
+
+
+class StubUpstream:
+    """ASGI app answering vitibrasil page requests from a ``CsvStore``."""
+
+    def __init__(
+        self,
+        store: CsvStore,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.pages = target_pages()
+        self.requests = 0
+        self.errors = 0
+
+    def render(self, query: dict) -> str | None:
+        key = (query.get("opcao", [None])[0], query.get("subopcao", [None])[0])
+        if key not in self.pages:
+            return None
+        dataset, category = self.pages[key]
+        year = int(query.get("ano", ["2023"])[0])
+        rows = self.store.lookup(dataset, year, category)
+        if dataset in TRADE_DATASETS:
+            table = synthetic.trade_table(rows)
+        else:
+            table = synthetic.general_table(rows)
+        return synthetic.page(table, title=f"{dataset} {category or ''} [{year}]")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        body, status = None, 500
+        if self.random.random() >= self.error_rate:
+            body = self.render(parse_qs(scope["query_string"].decode()))
+            status = 404 if body is None else 200
+        if status != 200:
+            self.errors += 1
+        payload = (body or "").encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"text/html; charset=utf-8"),
+                    (b"content-length", str(len(payload)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": payload})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--files-dir", default="files")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    store = CsvStore(args.files_dir)
+    store.load_all()
+    app = StubUpstream(
+        store,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Vitibrasil-like HTML pages built from CSV rows, for benchmarks and the stub."""
+
+from app.csv_store import CsvStore
+
+HEADER = """<!DOCTYPE html>
+<html lang="pt-br">
+<head>
+<meta charset="utf-8">
+<title>Banco de dados de uva, vinho e derivados</title>
+<link rel="stylesheet" href="css/estilo.css">
+<script src="js/jquery.js"></script>
+</head>
+<body>
+<table class="tb_base tb_header">
+  <tr><td><img src="img/logo.png" alt="Embrapa"></td></tr>
+</table>
+<table class="tb_base tb_menu">
+  <tr>
+    <td><button class="btn_opt" value="opt_01">Apresentação</button></td>
+    <td><button class="btn_opt" value="opt_02">Produção</button></td>
+    <td><button class="btn_opt" value="opt_03">Processamento</button></td>
+    <td><button class="btn_opt" value="opt_04">Comercialização</button></td>
+    <td><button class="btn_opt" value="opt_05">Importação</button></td>
+    <td><button class="btn_opt" value="opt_06">Exportação</button></td>
+  </tr>
+</table>
+<!-- <table class="tb_base tb_dados"><tbody><tr><td>old</td></tr></tbody></table> -->
+<div class="content_center">
+<p class="text_center">{title}</p>
+"""
+
+FOOTER = """</div>
+<table class="tb_base tb_footer">
+  <tr><td>Embrapa Uva e Vinho - Rua Livramento, 515 - Bento Gonçalves, RS</td></tr>
+</table>
+</body>
+</html>
+"""
+
+
+def format_number(value: int) -> str:
+    """Render a number the way vitibrasil does: dots as thousands, - for zero."""
+    return f"{value:,}".replace(",", ".") if value else "-"
+
+
+def general_table(items: list) -> str:
+    lines = [
+        '<table class="tb_base tb_dados">',
+        "<thead><tr><th>Produto</th><th>Quantidade (L.)</th></tr></thead>",
+        "<tbody>",
+    ]
+    for item in items:
+        lines.append(
+            f'<tr><td class="tb_item">\n  {item["item"]}\n</td>'
+            f'<td class="tb_item">\n  {format_number(item["quantity"])}\n</td></tr>'
+        )
+        for sub_item in item["sub_items"]:
+            lines.append(
+                f'<tr><td class="tb_subitem">\n  {sub_item["name"]}\n</td>'
+                f'<td class="tb_subitem">\n  {format_number(sub_item["quantity"])}'
+                "\n</td></tr>"
+            )
+    total = sum(item["quantity"] for item in items)
+    lines.append(
+        f'</tbody><tfoot class="tb_total"><tr><td>Total</td>'
+        f"<td>{format_number(total)}</td></tr></tfoot></table>"
+    )
+    return "\n".join(lines)
+
+
+def trade_table(rows: list) -> str:
+    lines = [
+        '<table class="tb_base tb_dados">',
+        "<thead><tr><th>Países</th><th>Quantidade (Kg)</th>"
+        "<th>Valor (US$)</th></tr></thead>",
+        "<tbody>",
+    ]
+    for row in rows:
+        lines.append(
+            f"<tr><td>\n  {row['country']}\n</td>"
+            f"<td>\n  {format_number(row['quantity'])}\n</td>"
+            f"<td>\n  {format_number(row['amount'])}\n</td></tr>"
+        )
+    lines.append("</tbody></table>")
+    return "\n".join(lines)
+
+
+def page(table: str, title: str = "Tabela") -> str:
+    return HEADER.format(title=title) + table + FOOTER
+
+
+def scale_general(items: list, scale: int) -> list:
+    """Repeat items ``scale`` times under distinct names."""
+    return [
+        {
+            **item,
+            "item": f"{item['item']} {copy}" if copy else item["item"],
+            "sub_items": list(item["sub_items"]),
+        }
+        for copy in range(scale)
+        for item in items
+    ]
+
+
+def scale_trade(rows: list, scale: int) -> list:
+    return [
+        {**row, "country": f"{row['country']} {copy}" if copy else row["country"]}
+        for copy in range(scale)
+        for row in rows
+    ]
+
+
+def sample_rows(files_dir: str = "files", year: int = 2023):
+    """Return real production and wine import rows to build pages from."""
+    store = CsvStore(files_dir)
+    store.load_all()
+    return (
+        store.lookup("producao", year).to_rows(),
+        store.lookup("importacao", year, "vinhos-de-mesa").to_rows(),
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import pytest
 from fastapi import HTTPException
@@ -9,6 +10,11 @@ from app.models import UserInDB
 def set_env(monkeypatch):
     monkeypatch.setenv("SECRET_KEY", "testsecret")
     monkeypatch.setenv("ALGORITHM", "HS256")
+    auth.get_settings.cache_clear()
+    auth.token_cache.clear()
+    yield
+    auth.get_settings.cache_clear()
+    auth.token_cache.clear()
 
 
 @pytest.fixture
@@ -107,3 +113,120 @@ async def test_get_current_active_user_inactive(fake_db):
     with pytest.raises(HTTPException) as exc:
         await auth.get_current_active_user(user)
     assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_caches_verified_token(fake_db, monkeypatch):
+    token = auth.create_access_token({"sub": "alice"})
+    monkeypatch.setattr(auth, "fake_users_db", fake_db)
+    assert (await auth.get_current_user(token)).username == "alice"
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("cached token must not be decoded again")
+
+    monkeypatch.setattr(auth.jwt, "decode", fail_decode)
+    assert (await auth.get_current_user(token)).username == "alice"
+
+
+def test_token_cache_expires_entries():
+    cache = auth.TokenCache()
+    user = auth.User(username="alice")
+    cache.put("expired", user, expires_at=0)
+    cache.put("valid", user, expires_at=2**40)
+    assert cache.get("expired") is None
+    assert cache.get("valid") == user
+
+
+def test_token_cache_is_bounded():
+    cache = auth.TokenCache(max_entries=2)
+    for token in ("a", "b", "c"):
+        cache.put(token, auth.User(username=token), expires_at=2**40)
+    assert cache.get("a") is None
+    assert cache.get("c").username == "c"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_user_forces_new_lookup(fake_db, monkeypatch):
+    token = auth.create_access_token({"sub": "alice"})
+    monkeypatch.setattr(auth, "fake_users_db", fake_db)
+    await auth.get_current_user(token)
+    fake_db["alice"]["disabled"] = True
+    auth.token_cache.invalidate_user("alice")
+    user = await auth.get_current_user(token)
+    with pytest.raises(HTTPException):
+        await auth.get_current_active_user(user)
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_async(fake_db):
+    user = await auth.authenticate_user_async(fake_db, "alice", "testpass")
+    assert user.username == "alice"
+    assert await auth.authenticate_user_async(fake_db, "alice", "wrong") is False
+    assert await auth.authenticate_user_async(fake_db, "ghost", "x") is False
+
+
+@pytest.mark.asyncio
+async def test_password_verifier_rejects_when_saturated():
+    verifier = auth.PasswordVerifier(workers=1, max_pending=1)
+    hashed = auth.get_password_hash("secret")
+    first = asyncio.ensure_future(verifier.verify("secret", hashed))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as exc:
+        await verifier.verify("secret", hashed)
+    assert exc.value.status_code == 503
+    assert await first is True
+    assert verifier.rejected == 1
+    verifier.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_verifier_pool_restarts_after_shutdown():
+    verifier = auth.PasswordVerifier(workers=1)
+    hashed = auth.get_password_hash("secret")
+    assert await verifier.verify("secret", hashed) is True
+    executor = verifier._executor
+    verifier.shutdown()
+    assert executor._shutdown
+    assert await verifier.verify("secret", hashed) is True
+    verifier.shutdown()
+
+
+@pytest.fixture
+def api_keys(fake_db, monkeypatch):
+    api_key, key_hash = auth.generate_api_key()
+    db = {key_hash: {"username": "alice"}}
+    monkeypatch.setattr(auth, "fake_users_db", fake_db)
+    monkeypatch.setattr(auth, "fake_api_keys_db", db)
+    return api_key, key_hash, db
+
+
+@pytest.mark.asyncio
+async def test_get_current_client_with_api_key(api_keys):
+    api_key, _, _ = api_keys
+    user = await auth.get_current_client(token=None, api_key=api_key)
+    assert user.username == "alice"
+
+
+@pytest.mark.asyncio
+async def test_get_current_client_rejects_unknown_and_revoked_keys(api_keys):
+    api_key, key_hash, db = api_keys
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_client(token=None, api_key="unknown")
+    assert exc.value.status_code == 401
+    del db[key_hash]
+    with pytest.raises(HTTPException):
+        await auth.get_current_client(token=None, api_key=api_key)
+
+
+@pytest.mark.asyncio
+async def test_get_current_client_with_bearer_token(api_keys):
+    token = auth.create_access_token({"sub": "alice"})
+    user = await auth.get_current_client(token=token, api_key=None)
+    assert user.username == "alice"
+
+
+@pytest.mark.asyncio
+async def test_get_current_client_without_credentials():
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_client(token=None, api_key=None)
+    assert exc.value.status_code == 401
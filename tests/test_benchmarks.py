@@ -0,0 +1,42 @@
+import pytest
+
+from app import scraping
+from app.csv_store import CsvStore
+from benchmarks import memory, synthetic
+from benchmarks.stub_server import StubUpstream
+
+
+@pytest.fixture(scope="module")
+def sample():
+    return synthetic.sample_rows()
+
+
+@pytest.mark.parametrize("engine", sorted(scraping.PARSER_ENGINES))
+def test_synthetic_pages_parse_back_to_their_rows(sample, engine):
+    general, trade = sample
+    html = synthetic.page(synthetic.general_table(general))
+    assert scraping.parse_html_table(2023, html, engine=engine) == general
+
+    html = synthetic.page(synthetic.trade_table(synthetic.scale_trade(trade, 2)))
+    rows = scraping.parse_import_export_table(2023, html, engine=engine)
+    assert len(rows) == 2 * len(trade)
+    assert rows[: len(trade)] == trade
+
+
+def test_stub_renders_every_scraped_page():
+    store = CsvStore("files")
+    store.load_all()
+    stub = StubUpstream(store)
+    for key in stub.pages:
+        query = {"opcao": [key[0]], "ano": ["2020"]}
+        if key[1]:
+            query["subopcao"] = [key[1]]
+        assert 'class="tb_base tb_dados"' in stub.render(query)
+    assert stub.render({"opcao": ["opt_99"]}) is None
+
+
+def test_retained_counts_only_what_is_kept():
+    kept, size = memory.retained(lambda: [bytearray(100_000)])
+    assert size >= 100_000
+    _, size = memory.retained(lambda: len(bytearray(100_000)))
+    assert size < 10_000
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from app import cache
+
+
+def test_ttl_for_closed_and_open_years(monkeypatch):
+    monkeypatch.setitem(cache.DATASET_TTLS, "producao", (60, 3600))
+    assert cache.ttl_for("producao", 1990) == 3600
+    assert cache.ttl_for("producao", 2100) == 60
+
+
+def test_evict_least_recently_used_entry():
+    results = cache.ResultCache(max_entries=2)
+    results.set("a", 1, ttl=60)
+    results.set("b", 2, ttl=60)
+    results.get("a")
+    results.set("c", 3, ttl=60)
+    assert "a" in results
+    assert "b" not in results
+    assert "c" in results
+
+
+def test_drop_entry_after_stale_window():
+    results = cache.ResultCache(stale_ttl=10)
+    results.set("a", 1, ttl=5, now=0)
+    assert results.get("a", now=14).value == 1
+    assert results.get("a", now=15) is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_does_not_store_failures():
+    results = cache.ResultCache()
+
+    async def loader():
+        return None
+
+    assert await results.get_or_load("a", loader, ttl=60) is None
+    assert "a" not in results
+
+
+@pytest.mark.asyncio
+async def test_serve_stale_value_while_refreshing():
+    results = cache.ResultCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return len(calls)
+
+    assert await results.get_or_load("a", loader, ttl=0) == 1
+    assert await results.get_or_load("a", loader, ttl=0) == 1
+    await asyncio.sleep(0)
+    assert results.get("a").value == 2
+    assert results.stats()["stale_hits"] == 1
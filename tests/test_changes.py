@@ -0,0 +1,166 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import cache, scraping, services
+from app.auth import get_current_active_client
+from app.changes import diff_rows
+from app.circuit import CircuitBreaker
+from app.main import app
+from app.models import User
+from app.singleflight import SingleFlight
+from app.snapshot import Snapshot, SnapshotStore
+
+
+def trade(country, quantity):
+    return {"country": country, "quantity": quantity, "amount": 1, "year": 2020}
+
+
+def test_diff_rows_by_name():
+    previous = [trade("Chile", 1), trade("Peru", 2), trade("Uruguai", 3)]
+    current = [trade("Uruguai", 3), trade("Chile", 5), trade("Italia", 4)]
+    changes = {(change.name, change.change) for change in diff_rows(previous, current)}
+    assert changes == {("Chile", "changed"), ("Italia", "added"), ("Peru", "removed")}
+    assert diff_rows(previous, list(reversed(previous))) == []
+
+
+def test_diff_rows_reports_sub_item_changes_and_repeated_names():
+    item = {"item": "VINHO", "quantity": 3, "year": 2020, "sub_items": []}
+    revised = {**item, "sub_items": [{"name": "Tinto", "quantity": 3}]}
+    [change] = diff_rows([item, item], [item, revised])
+    assert (change.name, change.change) == ("VINHO", "changed")
+    assert change.previous == item and change.row == revised
+
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / "snapshots.sqlite3"))
+    monkeypatch.setattr(services, "snapshots", store)
+    monkeypatch.setattr(services, "upstream_flight", SingleFlight())
+    monkeypatch.setattr(services, "held_tables", {})
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache())
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    with open("tests/fixtures/general_parser_item.html") as f:
+        pages = [f.read()]
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content=pages[-1])
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    return pages
+
+
+@pytest.mark.asyncio
+async def test_refresh_records_revised_rows(snapshots, pages):
+    await services.refresh_table("producao", 2020)
+    assert snapshots.changes() == ([], 0, False)
+
+    pages.append(pages[0].replace("502.666.358", "502.666.400"))
+    await services.refresh_table("producao", 2020)
+    await services.refresh_table("producao", 2020)
+    changes, version, more = snapshots.changes()
+    assert [(c["name"], c["change"], c["year"]) for c in changes] == [
+        ("TINTAS", "changed", 2020)
+    ]
+    assert changes[0]["previous"]["quantity"] == 502666358
+    assert changes[0]["row"]["quantity"] == 502666400
+    assert (version, more) == (changes[0]["version"], False)
+    assert snapshots.changes(since=version) == ([], version, False)
+
+
+@pytest.mark.asyncio
+async def test_empty_or_unrelated_page_records_no_changes(
+    snapshots, pages, monkeypatch
+):
+    breaker = CircuitBreaker("producao")
+    monkeypatch.setitem(services.upstream_breakers, "producao", breaker)
+    expected = await services.refresh_table("producao", 2020)
+    pages.append("<html><body>No data</body></html>")
+    assert await services.refresh_table("producao", 2020) == expected
+    pages.append(pages[0].replace("TINTAS", "ROSADOS"))
+    assert await services.refresh_table("producao", 2020) == expected
+    assert snapshots.changes() == ([], 0, False)
+
+    assert breaker.failure_rate() == pytest.approx(1 / 3)
+    assert services.held_tables[("producao", None, 2020)][1] == 1
+
+
+@pytest.mark.asyncio
+async def test_unrelated_table_replaces_snapshot_after_consistent_scrapes(
+    snapshots, pages, monkeypatch
+):
+    monkeypatch.setattr(services, "TABLE_REPLACE_AFTER", 3)
+    expected = await services.refresh_table("producao", 2020)
+    pages.append(pages[0].replace("TINTAS", "ROSADOS"))
+    assert await services.refresh_table("producao", 2020) == expected
+    pages.append(pages[0].replace("TINTAS", "BRANCOS"))
+    assert await services.refresh_table("producao", 2020) == expected
+    assert await services.refresh_table("producao", 2020) == expected
+    assert snapshots.changes() == ([], 0, False)
+
+    replaced = await services.refresh_table("producao", 2020)
+    assert replaced != expected and not services.held_tables
+    changes, _, _ = snapshots.changes()
+    assert {(c["name"], c["change"]) for c in changes} == {
+        ("TINTAS", "removed"),
+        ("BRANCOS", "added"),
+    }
+
+
+def test_changes_are_paged_by_version(snapshots):
+    store = snapshots
+    previous = [trade(country, 1) for country in "ABC"]
+    for quantity in (2, 3):
+        current = [trade(country, quantity) for country in "ABC"]
+        store.put(
+            Snapshot(
+                url="http://upstream/",
+                year=2020,
+                dataset="importacao",
+                category="espumantes",
+                fetched_at=1.0,
+                etag=None,
+                last_modified=None,
+                content_hash=str(quantity),
+                data=current,
+            ),
+            diff_rows(previous, current),
+        )
+        previous = current
+
+    first, version, more = store.changes(limit=4)
+    assert [change["version"] for change in first] == [1, 2, 3, 4] and more
+    rest, version, more = store.changes(since=version, limit=4)
+    assert [change["version"] for change in rest] == [5, 6] and not more
+    assert store.changes(dataset="producao") == ([], 6, False)
+
+
+def test_changes_route(snapshots, pages):
+    app.dependency_overrides[get_current_active_client] = lambda: User(username="test")
+    try:
+        with TestClient(app) as client:
+            assert client.get("/v1/changes").json() == {
+                "since": 0,
+                "version": 0,
+                "more": False,
+                "changes": [],
+            }
+            client.portal.call(services.refresh_table, "producao", 2020)
+            pages.append(pages[0].replace("502.666.358", "502.666.400"))
+            client.portal.call(services.refresh_table, "producao", 2020)
+
+            body = client.get("/v1/changes?dataset=production").json()
+            assert [
+                (c["dataset"], c["name"], c["change"]) for c in body["changes"]
+            ] == [("production", "TINTAS", "changed")]
+            assert (
+                client.get(f"/v1/changes?since={body['version']}").json()["changes"]
+                == []
+            )
+            assert client.get("/v1/changes?dataset=other").status_code == 422
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,88 @@
+import pytest
+from app import circuit, scraping, services
+from app.cache import ResultCache
+
+
+def test_open_when_failure_rate_reaches_threshold():
+    breaker = circuit.CircuitBreaker("test", failure_threshold=0.5, min_calls=4)
+    for outcome in (True, False, True):
+        assert breaker.allow()
+        breaker.record_success() if outcome else breaker.record_failure()
+    assert breaker.state == circuit.CLOSED
+    breaker.record_failure()
+    assert breaker.state == circuit.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_half_open_probe_closes_on_success():
+    breaker = circuit.CircuitBreaker("test", min_calls=1, open_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == circuit.OPEN
+    assert breaker.allow()
+    assert breaker.state == circuit.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == circuit.CLOSED
+
+
+def test_half_open_probe_reopens_on_failure():
+    breaker = circuit.CircuitBreaker("test", min_calls=1, open_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == circuit.OPEN
+
+
+@pytest.mark.asyncio
+async def test_services_fall_back_to_csv_without_fetching_when_open(monkeypatch):
+    breaker = circuit.CircuitBreaker("producao", min_calls=1, open_seconds=60)
+    breaker.record_failure()
+    monkeypatch.setitem(services.upstream_breakers, "producao", breaker)
+    monkeypatch.setattr(services.cache, "result_cache", ResultCache())
+    monkeypatch.setattr(services, "snapshots", None)
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        raise AssertionError("upstream must not be called while open")
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    results = await services.production_data(2023)
+    assert results[0]["item"] == "VINHO DE MESA"
+
+
+@pytest.mark.asyncio
+async def test_raising_fetch_records_a_failure(monkeypatch):
+    breaker = circuit.CircuitBreaker("producao", min_calls=1, open_seconds=0)
+    breaker.record_failure()
+    monkeypatch.setitem(services.upstream_breakers, "producao", breaker)
+    monkeypatch.setattr(services.cache, "result_cache", ResultCache())
+    monkeypatch.setattr(services, "snapshots", None)
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    assert await services.refresh_table("producao", 2023) is None
+    assert breaker.state == circuit.OPEN
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_raising_parse_records_a_failure(monkeypatch):
+    breaker = circuit.CircuitBreaker("producao", min_calls=1, open_seconds=0)
+    breaker.record_failure()
+    monkeypatch.setitem(services.upstream_breakers, "producao", breaker)
+    monkeypatch.setattr(services.cache, "result_cache", ResultCache())
+    monkeypatch.setattr(services, "snapshots", None)
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content="<table></table>")
+
+    def parse_html_table(**kwargs):
+        raise IndexError("list index out of range")
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    monkeypatch.setattr(scraping, "parse_html_table", parse_html_table)
+    assert await services.refresh_table("producao", 2023) is None
+    assert breaker.state == circuit.OPEN
+    assert breaker.allow()
@@ -0,0 +1,65 @@
+import os
+import shutil
+
+from app import csv_store
+from app.csv_store import CsvStore, iter_sources
+
+
+def test_load_every_source():
+    store = CsvStore(files_dir="files")
+    store.load_all()
+    for dataset, category, source in iter_sources():
+        assert (dataset, category) in store._mtimes
+        assert (dataset, category, 2020) in store._index
+
+
+def test_lookup_returns_rows_for_year():
+    store = CsvStore(files_dir="files")
+    store.load_all()
+    rows = store.lookup("producao", 2023)
+    assert rows[0]["item"] == "VINHO DE MESA"
+    assert rows[0]["quantity"] == 169762429
+    assert store.lookup("producao", 1900) == []
+
+
+def test_reload_file_when_it_changes(tmp_path):
+    shutil.copy("files/producao.csv", tmp_path / "producao.csv")
+    store = CsvStore(files_dir=str(tmp_path), reload_interval=0)
+    store.load_all()
+    assert store.lookup("producao", 2023)[0]["item"] == "VINHO DE MESA"
+
+    path = tmp_path / "producao.csv"
+    path.write_text(
+        path.read_text(encoding="utf-8").replace("VINHO DE MESA", "VINHO"),
+        encoding="utf-8",
+    )
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert store.lookup("producao", 2023)[0]["item"] == "VINHO"
+
+
+def test_blank_and_short_lines_are_skipped(tmp_path):
+    for source in ("importacao-espumantes.csv", "producao.csv"):
+        shutil.copy(f"files/{source}", tmp_path / source)
+        with open(tmp_path / source, "a", encoding="utf-8") as f:
+            f.write("\n\n99\n")
+    store = CsvStore(files_dir=str(tmp_path))
+    store.load_all()
+    assert store.lookup("importacao", 2020, "espumantes")
+    assert store.lookup("producao", 2023)[0]["item"] == "VINHO DE MESA"
+
+
+def test_failed_reload_keeps_the_loaded_data(tmp_path, monkeypatch):
+    shutil.copy("files/producao.csv", tmp_path / "producao.csv")
+    store = CsvStore(files_dir=str(tmp_path), reload_interval=0)
+    store.load_all()
+
+    def broken(*args):
+        raise IndexError("list index out of range")
+
+    monkeypatch.setattr(csv_store, "general_csv_years", broken)
+    path = tmp_path / "producao.csv"
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert store.lookup("producao", 2023)[0]["item"] == "VINHO DE MESA"
+    assert store._mtimes[("producao", None)] == stat.st_mtime_ns + 1_000_000_000
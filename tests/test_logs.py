@@ -0,0 +1,53 @@
+import logging
+
+import pytest
+
+from app import logs
+
+
+def make_record(name, level=logging.INFO, msg="Request html"):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+def test_parse_settings():
+    assert logs.parse_settings("app.scraping=DEBUG, httpx = WARNING,,bad") == {
+        "app.scraping": "DEBUG",
+        "httpx": "WARNING",
+    }
+
+
+def test_sampling_keeps_one_in_n_per_message_and_every_warning():
+    sampler = logs.SamplingFilter({"app.scraping": 0.25})
+    kept = [sampler.filter(make_record("app.scraping")) for _ in range(8)]
+    assert kept.count(True) == 2
+    assert sampler.filter(make_record("app.scraping", msg="Other message"))
+    assert sampler.filter(make_record("app.scraping.child", level=logging.ERROR))
+    assert all(sampler.filter(make_record("app.services")) for _ in range(3))
+
+
+@pytest.mark.asyncio
+async def test_request_summary_includes_upstream_time(monkeypatch):
+    lines = []
+
+    class Recorder:
+        def info(self, event, **fields):
+            lines.append((event, fields))
+
+    async def app(scope, receive, send):
+        logs.record_upstream(0.25)
+        logs.record_upstream(0.5)
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    monkeypatch.setattr(logs, "access_logger", Recorder())
+    scope = {"type": "http", "method": "GET", "path": "/v1/production"}
+    await logs.RequestLogMiddleware(app)(scope, None, send)
+
+    event, fields = lines[0]
+    assert event == "request"
+    assert fields["status"] == 204
+    assert fields["upstream_calls"] == 2 and fields["upstream_ms"] == 750.0
+    assert logs.request_stats.get() is None
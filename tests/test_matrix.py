@@ -0,0 +1,22 @@
+from app.matrix import SeriesMatrix
+from app.parser_csv import general_csv_years, import_export_csv_years
+
+
+def test_general_rows_match_per_year_rows():
+    years = general_csv_years("files/producao.csv", key="produto", delimiter=";")
+    matrix = SeriesMatrix.from_general_years(years)
+    assert matrix.values["quantity"].shape == (len(matrix.names), len(years))
+    assert matrix.rows(2000, 2002) == years[2000] + years[2001] + years[2002]
+
+
+def test_trade_rows_match_per_year_rows():
+    years = import_export_csv_years("files/importacao-suco-de-uva.csv", delimiter=";")
+    matrix = SeriesMatrix.from_trade_years(years)
+    assert matrix.rows(2023, 2024) == years[2023] + years[2024]
+
+
+def test_rows_outside_loaded_years_are_empty():
+    years = general_csv_years("files/producao.csv", key="produto", delimiter=";")
+    matrix = SeriesMatrix.from_general_years(years)
+    assert matrix.rows(1950, 1960) == []
+    assert matrix.rows(2023, 2030) == years[2023]
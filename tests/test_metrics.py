@@ -0,0 +1,45 @@
+import pytest
+
+from app import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "registry", [])
+    return metrics.registry
+
+
+def test_histogram_renders_cumulative_buckets(registry):
+    histogram = metrics.Histogram("work_seconds", "Work.", ("kind",), buckets=(1, 2))
+    histogram.labels("a").observe(0.5)
+    histogram.labels("a").observe(1)
+    histogram.labels("a").observe(3)
+    lines = metrics.render().splitlines()
+    assert "# TYPE work_seconds histogram" in lines
+    assert 'work_seconds_bucket{kind="a",le="1.0"} 2' in lines
+    assert 'work_seconds_bucket{kind="a",le="2.0"} 2' in lines
+    assert 'work_seconds_bucket{kind="a",le="+Inf"} 3' in lines
+    assert 'work_seconds_sum{kind="a"} 4.5' in lines
+    assert 'work_seconds_count{kind="a"} 3' in lines
+
+
+def test_counter_and_collector(registry):
+    counter = metrics.Counter("jobs", "Jobs.", ("result",))
+    counter.labels("ok").inc()
+    counter.labels("ok").inc(2)
+    metrics.Collector("ratio", "Ratio.", ("name",), lambda: {('a"b',): 0.5})
+    text = metrics.render()
+    assert 'jobs_total{result="ok"} 3.0' in text
+    assert 'ratio{name="a\\"b"} 0.5' in text
+
+
+def test_timed_observes_failures_too(registry):
+    histogram = metrics.Histogram("call_seconds", "Calls.", ("fn",))
+
+    @metrics.timed(histogram, "boom")
+    def boom():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        boom()
+    assert 'call_seconds_count{fn="boom"} 1' in metrics.render()
@@ -3,7 +3,9 @@ from app.parser_csv import (
     parse_str_to_number,
     read_csv_file,
     general_csv,
+    general_csv_years,
     import_export_csv,
+    import_export_csv_years,
 )
 
 
@@ -164,6 +166,23 @@ def test_import_export_csv():
     assert result == expected
 
 
+def test_general_csv_years_matches_general_csv():
+    result = general_csv_years("files/producao.csv", key="produto", delimiter=";")
+    assert sorted(result) == list(range(1970, 2024))
+    for year in (1970, 1999, 2023):
+        assert result[year] == general_csv(
+            "files/producao.csv", year=year, key="produto", delimiter=";"
+        )
+
+
+def test_import_export_csv_years_matches_import_export_csv():
+    path = "files/importacao-vinhos-de-mesa.csv"
+    result = import_export_csv_years(path, delimiter="\t")
+    assert sorted(result) == list(range(1970, 2025))
+    for year in (1970, 2010, 2024):
+        assert result[year] == import_export_csv(path, year=year, delimiter="\t")
+
+
 def test_parse_str_to_number_int():
     assert parse_str_to_number("123") == 123
     assert parse_str_to_number(456) == 456
@@ -0,0 +1,68 @@
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import profiling, services
+from app.auth import get_current_active_client
+from app.main import app
+from app.models import User
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    monkeypatch.setattr(profiling, "TOKEN", "secret")
+    monkeypatch.setattr(profiling, "profiles", profiling.SlowestProfiles(2))
+    monkeypatch.setattr(services, "snapshots", None)
+    app.dependency_overrides[get_current_active_client] = lambda: User(username="test")
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+def test_fold_is_root_first():
+    stack = profiling.fold(sys._getframe())
+    assert stack.endswith(f"{__name__}:test_fold_is_root_first")
+    assert ";" in stack
+
+
+def test_slowest_profiles_keeps_the_slowest():
+    kept = profiling.SlowestProfiles(2)
+    for duration in (0.3, 0.1, 0.5, 0.2):
+        kept.add(profiling.Profile(str(duration), "GET", "/", 0, duration))
+    assert [profile.id for profile in kept.all()] == ["0.5", "0.3"]
+    assert kept.get("0.1") is None
+
+
+def test_profiled_request_can_be_fetched_as_folded_stacks(client):
+    headers = {"X-Profile": "secret"}
+    response = client.get(
+        "/v1/production?start_year=2000&end_year=2001", headers=headers
+    )
+    profile_id = response.headers["x-profile-id"]
+
+    listed = client.get("/debug/profiles", headers=headers).json()
+    assert listed[0]["id"] == profile_id and listed[0]["path"] == "/v1/production"
+
+    folded = client.get(f"/debug/profiles/{profile_id}", headers=headers).text
+    for line in folded.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+
+def test_requests_without_the_token_are_not_profiled(client):
+    response = client.get(
+        "/v1/production?start_year=2000&end_year=2001", headers={"X-Profile": "nope"}
+    )
+    assert "x-profile-id" not in response.headers
+    assert (
+        client.get("/debug/profiles", headers={"X-Profile": "nope"}).status_code == 403
+    )
+    assert client.get("/debug/profiles").status_code == 403
+
+
+def test_debug_routes_are_hidden_when_disabled(client, monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", False)
+    response = client.get("/debug/profiles", headers={"X-Profile": "secret"})
+    assert response.status_code == 404
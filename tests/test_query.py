@@ -0,0 +1,87 @@
+import pytest
+
+from app import query
+from app.matrix import SeriesMatrix
+from app.parser_csv import import_export_csv_years
+from app.table import Table
+
+ROWS = [
+    {"country": "Chile", "quantity": 10, "amount": 100, "year": 2000},
+    {"country": "Italia", "quantity": 30, "amount": 50, "year": 2000},
+    {"country": "Peru", "quantity": 0, "amount": 0, "year": 2000},
+    {"country": "Uruguai", "quantity": 20, "amount": 70, "year": 2000},
+]
+
+
+def countries(rows):
+    return [row["country"] for row in rows]
+
+
+@pytest.mark.parametrize(
+    "sort, expected",
+    [
+        ("quantity", ["Chile", "Uruguai", "Italia"]),
+        ("-quantity", ["Italia", "Uruguai", "Chile"]),
+        ("-amount", ["Chile", "Uruguai", "Italia"]),
+        (None, ["Chile", "Italia", "Uruguai"]),
+    ],
+)
+def test_min_quantity_with_every_sort(sort, expected):
+    rows, _ = query.query_rows(ROWS, min_quantity=1, sort=sort)
+    assert countries(rows) == expected
+
+
+def test_country_filter_is_case_insensitive_and_sorted():
+    rows, _ = query.query_rows(ROWS, countries=["peru", "CHILE"], sort="-quantity")
+    assert countries(rows) == ["Chile", "Peru"]
+
+
+def test_pages_follow_the_cursor():
+    first, cursor = query.query_rows(ROWS, sort="country", limit=3)
+    second, last = query.query_rows(ROWS, sort="country", limit=3, cursor=cursor)
+    assert countries(first + second) == ["Chile", "Italia", "Peru", "Uruguai"]
+    assert last is None
+
+
+def test_fields_projection():
+    rows, _ = query.query_rows(ROWS, fields=["country", "amount"], limit=1)
+    assert rows == [{"country": "Chile", "amount": 100}]
+
+
+def test_index_is_reused_for_the_same_table():
+    table = Table.from_rows(ROWS, 2000)
+    assert query.index_for(table) is query.index_for(table)
+    assert query.index_for(Table.from_rows(ROWS, 2000)) is not query.index_for(table)
+    assert query.index_for(ROWS) is not query.index_for(ROWS)
+
+
+def test_series_are_queried_through_one_matrix_index():
+    years = import_export_csv_years("files/importacao-espumantes.csv", delimiter="\t")
+    matrix = SeriesMatrix.from_trade_years(years)
+    rows = matrix.rows(2000, 2002)
+    for params in (
+        {"min_quantity": 1, "sort": "-quantity", "limit": 5},
+        {"countries": ["chile", "italia"], "fields": ["country", "year"]},
+        {"sort": "amount", "limit": 7, "cursor": query.encode_cursor(7)},
+        {"min_quantity": 100, "sort": "quantity"},
+        {},
+    ):
+        assert query.query_rows(
+            matrix, years=(2000, 2002), **params
+        ) == query.query_rows(rows, **params)
+    assert query.index_for(matrix) is query.index_for(matrix)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        query.decode_cursor("not a cursor")
+
+
+def test_tables_query_like_their_rows():
+    table = Table.from_rows(ROWS, 2000)
+    for params in (
+        {"min_quantity": 1, "sort": "-quantity"},
+        {"countries": ["italia"], "fields": ["country", "amount"]},
+        {"sort": "amount", "limit": 2},
+    ):
+        assert query.query_rows(table, **params) == query.query_rows(ROWS, **params)
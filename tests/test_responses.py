@@ -0,0 +1,48 @@
+import gzip
+
+from app import responses
+
+
+def test_encode_json_matches_compact_json_response():
+    body = responses.encode_json([{"country": "África do Sul", "quantity": 1}])
+    assert body == '[{"country":"África do Sul","quantity":1}]'.encode("utf-8")
+
+
+def test_etag_matches():
+    etag = responses.make_etag(b"[]")
+    assert responses.etag_matches(etag, etag)
+    assert responses.etag_matches(f'"other", W/{etag}', etag)
+    assert responses.etag_matches("*", etag)
+    assert not responses.etag_matches('"other"', etag)
+    assert not responses.etag_matches(None, etag)
+
+
+def test_negotiate_encoding():
+    assert responses.negotiate_encoding("gzip, deflate, br") == "br"
+    assert responses.negotiate_encoding("gzip, br;q=0") == "gzip"
+    assert responses.negotiate_encoding("identity") is None
+    assert responses.negotiate_encoding(None) is None
+
+
+def test_compressed_variant_is_built_once(monkeypatch):
+    calls = []
+    compress = responses.compress
+
+    def counting_compress(body, encoding, fast=False):
+        calls.append(encoding)
+        return compress(body, encoding, fast)
+
+    monkeypatch.setattr(responses, "compress", counting_compress)
+    body = responses.encode_json([{"country": "Brasil", "quantity": 1}] * 100)
+    encoded = responses.EncodedBody(body, responses.make_etag(body), "public")
+    assert gzip.decompress(encoded.variant("gzip")) == body
+    encoded.variant("gzip")
+    assert calls == ["gzip"]
+    assert encoded.variant_etag("gzip") == encoded.etag[:-1] + '-gzip"'
+
+
+def test_fast_variants_use_a_cheap_level():
+    body = responses.encode_json([{"country": "Brasil", "quantity": 1}] * 100)
+    fast = responses.compress(body, "gzip", fast=True)
+    assert gzip.decompress(fast) == body
+    assert fast != responses.compress(body, "gzip")
@@ -0,0 +1,253 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from app.auth import get_current_active_client
+from app.main import app
+from app.models import User
+from app import auth, cache, responses, scraping, services
+from app.cache import ResultCache
+from app.csv_store import CsvStore, store
+from app.table import Table
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def fetch_page(url, etag=None, last_modified=None):
+        return None
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    monkeypatch.setattr(services, "snapshots", None)
+    monkeypatch.setattr(responses, "body_cache", ResultCache(stale_ttl=0))
+    app.dependency_overrides[get_current_active_client] = lambda: User(username="test")
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+def test_year_range_returns_every_year(client):
+    response = client.get("/v1/production?start_year=2020&end_year=2022")
+    assert response.status_code == 200
+    assert {row["year"] for row in response.json()} == {2020, 2021, 2022}
+
+
+def test_year_range_rejects_reversed_range(client):
+    response = client.get("/v1/production?start_year=2022&end_year=2020")
+    assert response.status_code == 422
+
+
+def test_batch_returns_status_per_item(client):
+    response = client.post(
+        "/v1/batch",
+        json={
+            "items": [
+                {"dataset": "production", "year": 2020},
+                {"dataset": "import", "category": "espumantes", "year": 2024},
+                {"dataset": "export", "category": "uvas-passas"},
+                {"dataset": "processing", "category": "viniferas", "year": 1900},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [200, 200, 422, 422]
+    assert results[0]["data"][0]["year"] == 2020
+    assert results[1]["request"] == {
+        "dataset": "import",
+        "category": "espumantes",
+        "year": 2024,
+    }
+
+
+def test_batch_rejects_empty_list(client):
+    assert client.post("/v1/batch", json={"items": []}).status_code == 422
+
+
+@pytest.fixture
+def upstream(client, monkeypatch):
+    with open("tests/fixtures/general_parser_item.html") as f:
+        html = f.read()
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content=html)
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    monkeypatch.setattr(cache, "result_cache", ResultCache())
+    return client
+
+
+def test_historical_year_has_etag_and_long_cache_control(upstream):
+    response = upstream.get("/v1/production?year=1990")
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == "public, max-age=86400"
+    assert response.json()[0]["year"] == 1990
+
+
+def test_if_none_match_returns_304_without_calling_services(upstream, monkeypatch):
+    etag = upstream.get("/v1/production?year=1991").headers["etag"]
+
+    async def production_data(year):
+        raise AssertionError("services must not be called")
+
+    monkeypatch.setattr(services, "production_data", production_data)
+    response = upstream.get("/v1/production?year=1991", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert upstream.get("/v1/production?year=1991").status_code == 200
+
+
+def test_csv_fallback_is_not_cached(client):
+    response = client.get("/v1/production?year=1992")
+    assert response.status_code == 200
+    assert response.json()[0]["year"] == 1992
+    assert response.headers["cache-control"] == "no-cache"
+    assert len(responses.body_cache) == 0
+
+
+def test_refreshed_table_drops_the_cached_body(upstream):
+    first = upstream.get("/v1/production?year=1993").json()
+    revised = [{**first[0], "quantity": first[0]["quantity"] + 1}]
+    key = ("producao", None, 1993)
+    cache.result_cache.set(key, Table.from_rows(revised, 1993), ttl=60)
+    assert upstream.get("/v1/production?year=1993").json() == revised
+
+
+def test_large_historical_body_is_sent_compressed(client):
+    response = client.get(
+        "/v1/import/vinhos-de-mesa?year=2000", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert response.json()[0]["year"] == 2000
+
+
+def test_fallback_body_is_compressed_fast_in_a_thread(client, monkeypatch):
+    monkeypatch.setattr(responses, "COMPRESSION_THREAD_MIN_SIZE", 0)
+    response = client.get(
+        "/v1/import/vinhos-de-mesa?year=2001", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.json()[0]["year"] == 2001
+
+
+def test_small_body_is_not_compressed(client):
+    response = client.get(
+        "/v1/processing/sem-classificacao?year=2000",
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert "content-encoding" not in response.headers
+
+
+def test_export_bulk_streams_ndjson(client):
+    response = client.get("/v1/export-bulk/import?start_year=2000&end_year=2001")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {row["year"] for row in rows} == {2000, 2001}
+    assert {row["dataset"] for row in rows} == {"import"}
+    assert {"category", "country", "quantity", "amount"} <= rows[0].keys()
+
+
+def test_export_bulk_streams_csv(client):
+    response = client.get(
+        "/v1/export-bulk/production?start_year=2000&end_year=2000",
+        headers={"Accept": "text/csv"},
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    header, *lines = response.text.splitlines()
+    assert header == "dataset,category,year,item,sub_item,quantity"
+    assert lines and all(line.startswith("production,") for line in lines)
+
+
+def test_stats_top_countries_by_amount(client):
+    response = client.get("/v1/stats/import/vinhos-de-mesa?op=top&year=2023&limit=3")
+    body = response.json()
+    assert response.status_code == 200
+    assert body["metric"] == "amount"
+    amounts = [row["amount"] for row in body["results"]]
+    assert len(amounts) == 3 and amounts == sorted(amounts, reverse=True)
+
+
+def test_stats_sum_of_flat_dataset(client):
+    response = client.get("/v1/stats/production?op=sum&start_year=2000&end_year=2002")
+    assert [row["year"] for row in response.json()["results"]] == [2000, 2001, 2002]
+
+
+def test_stats_rejects_unknown_category_and_metric(client):
+    assert client.get("/v1/stats/import/nope").status_code == 404
+    assert client.get("/v1/stats/production?metric=amount").status_code == 422
+
+
+def test_import_pages_filters_and_projects(client):
+    url = "/v1/import/vinhos-de-mesa?year=2000&min_quantity=1&sort=-quantity"
+    first = client.get(url + "&limit=2&fields=country,quantity")
+    rows = first.json()
+    assert len(rows) == 2 and set(rows[0]) == {"country", "quantity"}
+    assert rows[0]["quantity"] >= rows[1]["quantity"] >= 1
+
+    cursor = first.headers["x-next-cursor"]
+    second = client.get(url + f"&limit=2&fields=country,quantity&cursor={cursor}")
+    assert second.json()[0]["quantity"] <= rows[1]["quantity"]
+
+
+def test_import_country_filter_and_bad_fields(client):
+    response = client.get(
+        "/v1/export/vinhos-de-mesa?year=2000&country=chile&country=Alemanha,"
+        " República Democrática"
+    )
+    assert [row["country"] for row in response.json()] == [
+        "Alemanha, República Democrática",
+        "Chile",
+    ]
+    assert "x-next-cursor" not in response.headers
+    assert client.get("/v1/import/espumantes?fields=price").status_code == 422
+    assert client.get("/v1/import/espumantes?cursor=zzz").status_code == 422
+
+
+def test_filtered_import_of_an_empty_table(client, monkeypatch, tmp_path):
+    async def fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content="<html><body>No data</body></html>")
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    monkeypatch.setattr(cache, "result_cache", ResultCache())
+    monkeypatch.setattr(services, "store", CsvStore(files_dir=str(tmp_path)))
+    response = client.get("/v1/import/espumantes?year=2024&country=chile")
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_metrics_report_routes_parsers_and_fallbacks(client):
+    client.get("/v1/production?year=2001")
+    text = client.get("/metrics").text
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/v1/production",'
+        'status="200"}' in text
+    )
+    assert 'data_source_total{dataset="producao",source="csv"}' in text
+    assert "upstream_request_duration_seconds" in text
+    assert 'parse_duration_seconds_count{parser="general_csv_years"}' in text
+    assert 'cache_hit_ratio{cache="result"}' in text
+
+
+def test_shutdown_stops_the_bcrypt_pool(monkeypatch):
+    monkeypatch.setattr(services, "snapshots", None)
+    hashed = auth.get_password_hash("secret")
+    with TestClient(app) as client:
+        assert client.portal.call(auth.password_verifier.verify, "secret", hashed)
+        assert auth.password_verifier._executor is not None
+    assert auth.password_verifier._executor is None
+
+
+def test_csv_reload_drops_cached_series_bodies(client, monkeypatch):
+    url = "/v1/production?start_year=2000&end_year=2001"
+    first = client.get(url)
+    assert first.headers["cache-control"] == "public, max-age=86400"
+
+    def series_data(dataset, start_year, end_year, category=None):
+        return []
+
+    monkeypatch.setattr(services, "series_data", series_data)
+    assert client.get(url).json() == first.json()
+    monkeypatch.setattr(store, "generation", store.generation + 1)
+    assert client.get(url).json() == []
@@ -1,3 +1,5 @@
+import httpx
+import pytest
 from app import scraping
 
 
@@ -13,6 +15,114 @@ def test_parser_str_to_number_returns_0_when_argument_is_invalid():
     assert scraping.parse_str_to_number("-") == 0
 
 
+class TestFetchPage:
+    @pytest.mark.asyncio
+    async def test_return_body_when_upstream_responds(self, monkeypatch):
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content="<table></table>".encode())
+        )
+        monkeypatch.setattr(scraping, "_client", httpx.AsyncClient(transport=transport))
+        page = await scraping.fetch_page("http://upstream/")
+        assert page.content == "<table></table>"
+
+    @pytest.mark.asyncio
+    async def test_return_none_when_upstream_fails(self, monkeypatch):
+        transport = httpx.MockTransport(lambda request: httpx.Response(503))
+        monkeypatch.setattr(scraping, "_client", httpx.AsyncClient(transport=transport))
+        assert await scraping.fetch_page("http://upstream/") is None
+
+    @pytest.mark.asyncio
+    async def test_send_validators_and_report_not_modified(self, monkeypatch):
+        def handler(request):
+            assert request.headers["If-None-Match"] == '"v1"'
+            assert request.headers["If-Modified-Since"] == "yesterday"
+            return httpx.Response(304)
+
+        transport = httpx.MockTransport(handler)
+        monkeypatch.setattr(scraping, "_client", httpx.AsyncClient(transport=transport))
+        page = await scraping.fetch_page(
+            "http://upstream/", etag='"v1"', last_modified="yesterday"
+        )
+        assert page.not_modified
+        assert page.content is None
+
+    @pytest.mark.asyncio
+    async def test_raise_when_url_is_empty(self):
+        with pytest.raises(ValueError):
+            await scraping.fetch_page("")
+
+
+def test_target_name_follows_retargeted_pages(monkeypatch):
+    monkeypatch.setitem(
+        scraping.SCRAPER_TARGETS, "producao", "http://stub/index.php?opcao=opt_02"
+    )
+    assert scraping.target_name("http://stub/index.php?opcao=opt_02&ano=2020") == (
+        "producao"
+    )
+    url = scraping.SCRAPER_TARGETS["importacao"]["espumantes"]
+    assert scraping.target_name(f"{url}&ano=2020") == "importacao/espumantes"
+    assert scraping.target_name("http://elsewhere/") == "other"
+
+
+PAGE = """
+<html><body>
+<table class="tb_base"><tr><td class="tb_item">menu</td></tr></table>
+<!-- <table class="tb_base tb_dados"> -->
+<table class="tb_base tb_dados">
+  <thead><tr><th>Produto</th><th>Quantidade (L.)</th></tr></thead>
+  <tbody>
+    <tr><td class="tb_item">  VINHO DE MESA </td><td class="tb_item">1.234</td></tr>
+    <tr>
+      <td class="tb_subitem"><b>Tinto</b> &amp; <i>Ros&eacute;</i><!-- note --></td>
+      <td class="tb_subitem">1.000</td>
+    </tr>
+    <tr><td class="tb_subitem other">Branco</td><td class="tb_subitem">-</td></tr>
+  </tbody>
+  <tfoot><tr><td class="tb_item">Total</td><td class="tb_item">2.234</td></tr></tfoot>
+</table>
+<p>footer</p>
+</body></html>
+"""
+
+
+class TestParserEngines:
+    @pytest.mark.parametrize("engine", ["fast", "bs4"])
+    def test_extract_table_rows(self, engine):
+        assert scraping.extract_table_rows(PAGE, engine=engine) == [
+            [("tb_item", "VINHO DE MESA"), ("tb_item", "1.234")],
+            [("tb_subitem", "Tinto&Rosé"), ("tb_subitem", "1.000")],
+            [("tb_subitem", "Branco"), ("tb_subitem", "-")],
+        ]
+
+    @pytest.mark.parametrize("engine", ["fast", "bs4"])
+    def test_return_none_when_table_is_missing(self, engine):
+        assert scraping.extract_table_rows("<table></table>", engine=engine) is None
+
+    @pytest.mark.parametrize(
+        "path",
+        [
+            "tests/fixtures/general_parser_item.html",
+            "tests/fixtures/general_parser_item_subitem.html",
+            "tests/fixtures/import_export_table.html",
+        ],
+    )
+    def test_engines_agree_on_fixtures(self, path):
+        with open(path, "r") as f:
+            html_content = f.read()
+        assert scraping.extract_table_rows(
+            html_content, engine="fast"
+        ) == scraping.extract_table_rows(html_content, engine="bs4")
+
+    def test_select_engine_from_environment(self, monkeypatch):
+        calls = []
+        monkeypatch.setitem(
+            scraping.PARSER_ENGINES, "bs4", lambda html: calls.append(html) or []
+        )
+        monkeypatch.setenv("PARSER_ENGINE", "bs4")
+        assert scraping.parse_html_table(html_content=PAGE) == []
+        assert calls == [PAGE]
+
+
 class TestGeneralParser:
     def test_return_empty_list_when_html_content_is_empty(self):
         assert scraping.parse_html_table(html_content="") == []
@@ -30,10 +140,7 @@ class TestGeneralParser:
                     "year": 2023,
                 }
             ]
-            assert (
-                scraping.parse_html_table(html_content=f.read())
-                == expected
-            )
+            assert scraping.parse_html_table(html_content=f.read()) == expected
 
     def test_return_item(self):
         with open("tests/fixtures/general_parser_item.html", "r") as f:
@@ -45,10 +152,18 @@ class TestGeneralParser:
                     "year": 2023,
                 }
             ]
-            assert (
-                scraping.parse_html_table(html_content=f.read())
-                == expected
-            )
+            assert scraping.parse_html_table(html_content=f.read()) == expected
+
+
+@pytest.mark.parametrize("engine", ["fast", "bs4"])
+def test_parsers_skip_short_rows(engine):
+    page = PAGE.replace("<tbody>", '<tbody><tr><td class="tb_item">TOTAL</td></tr>')
+    rows = scraping.parse_html_table(year=2020, html_content=page, engine=engine)
+    assert [row["item"] for row in rows] == ["VINHO DE MESA"]
+    assert (
+        scraping.parse_import_export_table(year=2020, html_content=page, engine=engine)
+        == []
+    )
 
 
 class TestImportExportParser:
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+
+from app import cache, scraping, services
+from app.shared import MappedSnapshot, SharedCache, write_snapshot
+from app.table import Table
+
+ROWS = [{"item": "VINHO", "quantity": 1, "year": 2020, "sub_items": []}]
+
+
+def test_write_and_map_snapshot(tmp_path):
+    path = str(tmp_path / "shared.bin")
+    future = time.time() + 60
+    write_snapshot(
+        path,
+        3,
+        [
+            (("producao", None, 2020), ROWS, future),
+            (("importacao", "espumantes", 2020), [], future),
+            (("producao", None, 2019), ROWS, time.time() - 1),
+        ],
+    )
+    snapshot = MappedSnapshot(path)
+    assert snapshot.generation == 3 and len(snapshot) == 3
+    assert snapshot.get(("producao", None, 2020)) == ROWS
+    assert snapshot.get(("importacao", "espumantes", 2020)) == []
+    assert snapshot.get(("producao", None, 2019)) is None
+    assert snapshot.get(("producao", None, 2018)) is None
+    snapshot.close()
+
+
+def test_mapped_tables_are_views_of_the_file(tmp_path):
+    path = str(tmp_path / "shared.bin")
+    rows = [
+        {"country": "Chile", "quantity": 5, "amount": 9, "year": 2020},
+        {"country": "Peru", "quantity": 1, "amount": 2, "year": 2020},
+    ]
+    key = ("importacao", "espumantes", 2020)
+    write_snapshot(path, 1, [(key, Table.from_rows(rows, 2020), time.time() + 60)])
+    snapshot = MappedSnapshot(path)
+    table = snapshot.get(key)
+    assert table == rows and table.kind == "trade"
+    assert not table.amount.flags.owndata and not table.amount.flags.writeable
+    snapshot.close()
+    assert table.to_rows() == rows
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        MappedSnapshot(str(path))
+
+
+def test_one_writer_and_readers_swap_versions(tmp_path):
+    path = str(tmp_path / "shared.bin")
+    writer = SharedCache(path, interval=0)
+    reader = SharedCache(path, interval=0)
+    assert writer.acquire() and writer.acquire()
+    assert not reader.acquire()
+
+    key = ("producao", None, 2020)
+    assert reader.get(key) is None
+    writer.publish([(key, ROWS, time.time() + 60)])
+    assert reader.get(key) == ROWS and reader.generation == 1
+
+    newer = [{**ROWS[0], "quantity": 2}]
+    writer.publish([(key, newer, time.time() + 60)])
+    assert reader.version() == 2
+    assert reader.get(key) == newer
+
+    writer.close()
+    assert reader.acquire()
+    reader.publish([])
+    assert reader.generation == 3
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_readers_serve_published_tables_without_fetching(tmp_path, monkeypatch):
+    path = str(tmp_path / "shared.bin")
+    key = ("producao", None, 2020)
+    write_snapshot(path, 1, [(key, ROWS, time.time() + 60)])
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        raise AssertionError("readers must not fetch published tables")
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    monkeypatch.setattr(services, "snapshots", None)
+    monkeypatch.setattr(services, "shared_cache", SharedCache(path))
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache())
+    assert await services.production_data(2020) == ROWS
+    assert len(cache.result_cache) == 0
+    services.shared_cache.close()
+
+
+@pytest.mark.asyncio
+async def test_new_writer_takes_over_the_published_tables(tmp_path, monkeypatch):
+    path = str(tmp_path / "shared.bin")
+    key = ("producao", None, 2020)
+    write_snapshot(path, 1, [(key, ROWS, time.time() + 60)])
+    shared_cache = SharedCache(path, interval=0.01)
+    shared_cache.reload()
+    acquired = asyncio.Event()
+    monkeypatch.setattr(services, "shared_cache", shared_cache)
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache())
+
+    task = asyncio.create_task(services.share_cache(acquired.set))
+    await asyncio.wait_for(acquired.wait(), 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert cache.result_cache.get(key).value == ROWS
+    shared_cache.close()
+
+
+def test_shared_entries_skip_stale_entries(monkeypatch):
+    result_cache = cache.ResultCache()
+    result_cache.set(("producao", None, 2020), ROWS, ttl=60)
+    result_cache.set(("producao", None, 2019), ROWS, ttl=0)
+    monkeypatch.setattr(cache, "result_cache", result_cache)
+    entries = services.shared_entries()
+    assert [key for key, _, _ in entries] == [("producao", None, 2020)]
+    assert entries[0][2] > time.time() + 50
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from app import cache, scraping, services
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {
+        "calls": 5,
+        "executions": 1,
+        "deduplicated": 4,
+        "inflight": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_exception():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream")
+
+    results = await asyncio.gather(
+        *(flight.do("key", work) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.executions == 1
+
+
+@pytest.mark.asyncio
+async def test_services_fetch_once_for_concurrent_requests(monkeypatch):
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache())
+    monkeypatch.setattr(services, "upstream_flight", SingleFlight())
+    monkeypatch.setattr(services, "snapshots", None)
+    with open("tests/fixtures/general_parser_item.html") as f:
+        html_content = f.read()
+    urls = []
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        urls.append(url)
+        await asyncio.sleep(0.01)
+        return scraping.Page(content=html_content)
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    results = await asyncio.gather(*(services.production_data(2001) for _ in range(10)))
+    assert len(urls) == 1
+    assert results[0][0]["item"] == "TINTAS"
+    assert services.upstream_flight.deduplicated == 9
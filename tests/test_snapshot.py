@@ -0,0 +1,119 @@
+import pytest
+from app import cache, circuit, scraping, services
+from app.singleflight import SingleFlight
+from app.snapshot import Snapshot, SnapshotStore
+
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / "snapshots.sqlite3"))
+    monkeypatch.setattr(services, "snapshots", store)
+    monkeypatch.setattr(services, "upstream_flight", SingleFlight())
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache())
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def html_content():
+    with open("tests/fixtures/general_parser_item.html") as f:
+        return f.read()
+
+
+def test_put_and_get_snapshot(tmp_path):
+    store = SnapshotStore(str(tmp_path / "nested" / "snapshots.sqlite3"))
+    snapshot = Snapshot(
+        url="http://upstream/",
+        year=2020,
+        dataset="producao",
+        category=None,
+        fetched_at=1.0,
+        etag='"abc"',
+        last_modified=None,
+        content_hash="hash",
+        data=[{"item": "VINHO", "quantity": 1, "year": 2020, "sub_items": []}],
+    )
+    store.put(snapshot)
+    assert store.get("http://upstream/", 2020) == snapshot
+    assert store.get("http://upstream/", 2021) is None
+    store.touch("http://upstream/", 2020, 2.0)
+    assert store.all()[0].fetched_at == 2.0
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_revalidate_with_conditional_get(snapshots, html_content, monkeypatch):
+    requests = []
+
+    async def fetch_page(url, etag=None, last_modified=None):
+        requests.append(etag)
+        if etag == '"v1"':
+            return scraping.Page(content=None, etag=etag, not_modified=True)
+        return scraping.Page(content=html_content, etag='"v1"')
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    first = await services.refresh_table("producao", 2020)
+    second = await services.refresh_table("producao", 2020)
+    assert requests == [None, '"v1"']
+    assert first == second
+    assert first[0]["item"] == "TINTAS"
+
+
+@pytest.mark.asyncio
+async def test_skip_parse_when_content_hash_matches(
+    snapshots, html_content, monkeypatch
+):
+    async def fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content=html_content)
+
+    parses = []
+    parse_html_table = scraping.parse_html_table
+
+    def counting_parse(**kwargs):
+        parses.append(1)
+        return parse_html_table(**kwargs)
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    monkeypatch.setattr(scraping, "parse_html_table", counting_parse)
+    await services.refresh_table("producao", 2020)
+    await services.refresh_table("producao", 2020)
+    assert len(parses) == 1
+
+
+@pytest.mark.asyncio
+async def test_serve_snapshot_on_startup_and_on_failure(
+    snapshots, html_content, monkeypatch
+):
+    async def fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content=html_content)
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    expected = await services.refresh_table("producao", 2020)
+
+    async def failing_fetch_page(url, etag=None, last_modified=None):
+        return None
+
+    monkeypatch.setattr(scraping, "fetch_page", failing_fetch_page)
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache())
+    assert services.load_snapshots() == 1
+    assert await services.production_data(2020) == expected
+    assert await services.refresh_table("producao", 2020) == expected
+
+
+@pytest.mark.asyncio
+async def test_empty_page_keeps_the_snapshot(snapshots, html_content, monkeypatch):
+    async def fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content=html_content)
+
+    monkeypatch.setattr(scraping, "fetch_page", fetch_page)
+    expected = await services.refresh_table("producao", 2020)
+
+    async def empty_fetch_page(url, etag=None, last_modified=None):
+        return scraping.Page(content="<html><body>No data</body></html>")
+
+    breaker = circuit.CircuitBreaker("producao", min_calls=1)
+    monkeypatch.setitem(services.upstream_breakers, "producao", breaker)
+    monkeypatch.setattr(scraping, "fetch_page", empty_fetch_page)
+    assert await services.refresh_table("producao", 2020) == expected
+    assert snapshots.get(scraping.SCRAPER_TARGETS["producao"], 2020).data == expected
+    assert breaker.state == circuit.OPEN
@@ -0,0 +1,69 @@
+import numpy as np
+
+from app.matrix import SeriesMatrix
+from app.stats import SeriesStats
+
+
+def trade_stats():
+    years = {
+        2000: [
+            {"country": "Chile", "quantity": 10, "amount": 100, "year": 2000},
+            {"country": "Italia", "quantity": 30, "amount": 50, "year": 2000},
+            {"country": "Peru", "quantity": 0, "amount": 0, "year": 2000},
+        ],
+        2001: [
+            {"country": "Chile", "quantity": 20, "amount": 150, "year": 2001},
+            {"country": "Italia", "quantity": 10, "amount": 200, "year": 2001},
+            {"country": "Peru", "quantity": 5, "amount": 50, "year": 2001},
+        ],
+    }
+    return SeriesStats.from_matrix(SeriesMatrix.from_trade_years(years))
+
+
+def test_sum_totals_every_metric_per_year():
+    assert trade_stats().sum(2000, 2001) == [
+        {"year": 2000, "quantity": 40, "amount": 150},
+        {"year": 2001, "quantity": 35, "amount": 400},
+    ]
+
+
+def test_top_ranks_one_year_and_ranges():
+    stats = trade_stats()
+    assert [row["name"] for row in stats.top("amount", 2001, 2001, 2)] == [
+        "Italia",
+        "Chile",
+    ]
+    top = stats.top("amount", 2000, 2001, 1)
+    assert top == [{"rank": 1, "name": "Chile", "amount": 250, "share": 0.454545}]
+
+
+def test_share_adds_others():
+    share = trade_stats().share("quantity", 2000, 2000, 1)
+    assert [(row["name"], row["quantity"]) for row in share] == [
+        ("Italia", 30),
+        ("Others", 10),
+    ]
+
+
+def test_growth_of_total_and_of_one_name():
+    stats = trade_stats()
+    assert stats.growth("amount", 2000, 2001)[1]["growth"] == round(250 / 150, 6)
+    peru = stats.growth("amount", 2000, 2001, name="peru")
+    assert peru[0]["growth"] is None and peru[1]["growth"] is None
+    assert peru[1]["change"] == 50
+
+
+def test_general_stats_only_count_top_level_items():
+    years = {
+        2000: [
+            {
+                "item": "VINHO",
+                "quantity": 10,
+                "year": 2000,
+                "sub_items": [{"name": "Tinto", "quantity": 10}],
+            }
+        ]
+    }
+    stats = SeriesStats.from_matrix(SeriesMatrix.from_general_years(years))
+    assert stats.names == ["VINHO"]
+    assert np.array_equal(stats.totals["quantity"], [10])
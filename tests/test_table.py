@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.matrix import SeriesMatrix
+from app.parser_csv import general_csv_years, import_export_csv_years
+from app.responses import encode_json
+from app.table import Table
+
+GENERAL = [
+    {
+        "item": "VINHO DE MESA",
+        "quantity": 10,
+        "year": 2020,
+        "sub_items": [
+            {"name": "Tinto", "quantity": 7},
+            {"name": "Branco", "quantity": 3},
+        ],
+    },
+    {"item": "SUCO", "quantity": 4, "year": 2020, "sub_items": []},
+]
+TRADE = [
+    {"country": "Chile", "quantity": 5, "amount": 9, "year": 2020, "category": "x"},
+    {"country": "Peru", "quantity": 0, "amount": 0, "year": 2020, "category": "x"},
+]
+
+
+@pytest.mark.parametrize("rows", [GENERAL, TRADE, []])
+def test_rows_round_trip(rows):
+    table = Table.from_rows(rows, 2020)
+    assert table.to_rows() == rows
+    assert len(table) == len(rows)
+    assert list(table) == rows
+    assert table[:] == rows
+    assert encode_json(table) == encode_json(rows)
+
+
+def test_columns_and_offsets():
+    table = Table.from_rows(GENERAL, 2020)
+    assert table.quantity.dtype == np.int64
+    assert table.sub_offsets.tolist() == [0, 2, 2]
+    assert table[-1] == GENERAL[1]
+    with pytest.raises(IndexError):
+        table[2]
+
+
+def test_empty_trade_table_keeps_its_kind():
+    table = Table.from_rows([], 2020, "trade")
+    assert table.kind == "trade"
+    assert table.columns() == {"country": [], "quantity": [], "amount": [], "year": []}
+    assert Table.from_rows([], 2020).columns()["amount"] == []
+
+
+def test_names_are_interned():
+    first = Table.from_rows(json.loads(json.dumps(TRADE)), 2020)
+    second = Table.from_rows(json.loads(json.dumps(TRADE)), 2021)
+    assert first.names[0] is second.names[0]
+
+
+def test_matrix_tables_share_names_and_match_csv_rows():
+    years = general_csv_years("files/producao.csv", key="produto", delimiter=";")
+    matrix = SeriesMatrix.from_general_years(years)
+    first, last = matrix.table(0), matrix.table(len(matrix.years) - 1)
+    assert first.names is last.names
+    assert first.to_rows() == years[first.year]
+    assert last.to_rows() == years[last.year]
+
+    years = import_export_csv_years("files/importacao-suco-de-uva.csv", delimiter=";")
+    matrix = SeriesMatrix.from_trade_years(years)
+    assert matrix.table(3).to_rows() == years[int(matrix.years[3])]
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+from app import services, warmer
+
+
+def test_iter_targets_covers_every_page_and_year():
+    targets = list(warmer.iter_targets())
+    assert len(targets) == len(set(targets))
+    assert ("producao", None, 2023) in targets
+    assert ("producao", None, 2024) not in targets
+    assert ("importacao", "suco-de-uva", 2024) in targets
+    assert ("processamento", "viniferas", 1970) in targets
+    assert len(targets) == 2 * 54 + 4 * 54 + 9 * 55
+
+
+@pytest.mark.asyncio
+async def test_crawl_loads_targets_with_bounded_concurrency(monkeypatch):
+    running, peak, loaded = 0, 0, []
+
+    async def refresh_table(dataset, year, category=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        loaded.append((dataset, category, year))
+        return [] if year % 2 else None
+
+    monkeypatch.setattr(services, "refresh_table", refresh_table)
+    crawler = warmer.Warmer(concurrency=2, rate=10000)
+    targets = [("producao", None, year) for year in range(2000, 2010)]
+    await crawler.crawl(targets, refresh=True)
+    assert sorted(loaded) == targets
+    assert peak <= 2
+    assert crawler.stats() == {"passes": 1, "loaded": 5, "failed": 5}